@@ -1,119 +1,28 @@
 import os
+import random
+import sys
 from typing import Optional
 from puzzle import BoardState
-import graphics
 import search
+import heuristics
 import time
-import pygame
-import play
-
-easy_1 = BoardState.from_string("""
-    .B.
-    RGR
-    .B.
-""")
-
-medium_1 = BoardState.from_string("""
-    ....
-    GBYB
-    BB.G
-    .R..
-""")
-
-hard_1 = BoardState.from_string("""
-        BB.G
-        RRR.
-        RRRB
-        .GB.
-""")
-
-hard_2 = BoardState.from_string("""
-        ..YY
-        BGRY
-        G.G.
-        RGB.
-""")
-
-hard_3 = BoardState.from_string("""
-        GB.B
-        .R..
-        .RR.
-        BRBG
-""")
-
-easy_big_1 = BoardState.from_string("""
-RR  R        Y     .
-.  Y            R  .
-.   G Y B  R G Y   .
-.   G           R R.
-.Y             GR  .
-.                 YY
-.     B   B     R  Y
-R      RY  R  B R  .
-.          R G     .
-.   RBB   Y        .
-""")
-
-hard_big_2 = BoardState.from_string("""
-B GG  RYRB
-R     RBY
-GG YGY
-GBR G
- RY   G  B
-   BBR
-GYY  YBY B
-RGRBGG
- RYR  RR
-B      G R
-""")
-
-medium_big = BoardState.from_string("""
-RR  R              .
-.  Y            R  .
-.   G Y    R G Y   .
-.   G           R R.
-.Y             G   .
-.                 YY
-.     B            Y
-R      R   R  B R  .
-.          R G     .
-.   RB    Y        .
-""")
-
-hard_big_3 = BoardState.from_string("""
-BGR   Y R.
-BRY     GG
-R    G Y .
-G   BGRB B
-. Y YYYB .
-. YR  R  R
-.  YR YGYG
-.G Y  R  B
-.B Y GYG .
-Y RYGGB Y.
-""")
-
-hard_big_4 = BoardState.from_string("""
-G   GR   R
-YGYBR BB .
-BYRG YG  G
-R Y   G R.
-GR BG RBYY
-B R  B RYB
-.G BY  BRG
-. GRRB RR.
-.GYY R  B.
-.G  YRBG Y
-""")
+import batch
+import generator
+
+# the menu needs pygame, it is only imported by the functions that draw so the headless commands
+# (any arguments) start without it
 
 
 def main():
+    import graphics
+    import pygame
+
     screen = graphics.init()
 
     logo = pygame.image.load(os.path.join(
         os.path.dirname(__file__), "..", "logo.webp")
     )
-    
+
     play_btn = graphics.Button("Play",  (200, 50))
     solve_btn = graphics.Button("Solve", (200, 50))
 
@@ -154,41 +63,41 @@ def main():
 
     # start_play()
     # solve_demo()
-    # compare_searches(medium_big)
+    # compare_searches(boards.medium_big)
 
 
-def start_play(screen: pygame.Surface, board: BoardState = None):
+def start_play(screen: 'pygame.Surface', board: BoardState = None):
+    import play
 
     game = play.Game(screen, board)
     game.play()
 
 
-def solve_demo(screen: pygame.Surface):
-    while True:
-        board = BoardState.generate_random(10, 10, 2)
+def solve_demo(screen: 'pygame.Surface'):
+    # only boards a quick greedy search could solve are shown
+    for _, board in generator.generate_boards(10, 10, seed=random.randrange(1 << 32)):
         if solve(board, screen):
             break
 
 
-def solve(board: BoardState, screen: pygame.Surface) -> bool:
+def solve(board: BoardState, screen: 'pygame.Surface') -> bool:
+    import graphics
+    import pygame
+
     print(board)
 
     graphics.draw_board(board, screen)
     pygame.display.flip()
 
-    heuristic = search.multi_heuristic([
-        (search.pieces_heuristic, lambda _: 100),
-        (search.manhattan_distance_heuristic(), lambda _: 1),
-        (search.manhattan_distance_heuristic(same_color=False), lambda _: -.2),
-        (search.piece_uniformity_heuristic, lambda _: 15),
-        # (search.touching_pieces, lambda _: .5),
-    ])
+    heuristic = heuristics.default_heuristic()
 
     res = measure_search(
         lambda: search.a_star(board, heuristic, weight=1.8, screen=screen),
-        "Weighted A*(x1.8) (Pieces(x100) + Distance(x1) + Repel(x-.2) + Uniformity(x20))",
+        "Weighted A*(x1.8) (Pieces(x100) + Attract(x1) + Repel(x-.2) + Uniformity(x15))",
     )
 
+    print("Heuristic cache:", heuristic.cache_info())
+
     if res is None:
         print("No solution found")
     else:
@@ -246,7 +155,7 @@ def measure_search(search, name: str) -> Optional[tuple[search.TreeNode, float]]
     node = search()
     if node is None:
         return None
-    
+
     duration = time.time() - start
 
     print("{} took {:.3f} seconds".format(name, duration))
@@ -258,4 +167,8 @@ def measure_search(search, name: str) -> Optional[tuple[search.TreeNode, float]]
 
 
 if __name__ == "__main__":
-    main()
+    # any arguments run the headless commands instead of the menu
+    if len(sys.argv) > 1:
+        batch.main(sys.argv[1:])
+    else:
+        main()
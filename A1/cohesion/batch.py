@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator
+from puzzle import BoardState, Direction
+from parallel import pool_context
+import generator
+import heuristics
+import search
+import solutions
+
+# headless batch solving: boards are streamed from a text file, solved on a pool of worker processes
+# and the results are written as json lines, run with
+# `python3 cohesion solve --input boards.txt --jobs 16 --out results.jsonl`
+# `python3 cohesion generate --count 100 --out boards.txt` writes a puzzle pack in the same format
+
+ALGORITHMS = ["astar", "greedy", "beam", "ida"]
+
+# set in each worker by init_worker
+worker_solve = None
+worker_algorithm = None
+worker_cache = None
+
+
+def make_solver(algorithm: str, weight: float):
+    # function from a board and a stats dict to a solution node
+    heuristic = heuristics.default_heuristic()
+
+    if algorithm == "astar":
+        return lambda board, stats: search.a_star(board, heuristic, weight=weight, stats=stats)
+    if algorithm == "greedy":
+        return lambda board, stats: search.greedy_search(board, heuristic, stats=stats)
+    if algorithm == "beam":
+        return lambda board, stats: search.beam_search(board, heuristic, beam_width=200, weight=weight, stats=stats)
+    if algorithm == "ida":
+        admissible = search.multi_heuristic(
+            [(heuristics.mst_gap_heuristic, lambda _: 1)])
+        return lambda board, stats: search.ida_star(board, admissible, weight=weight, stats=stats)
+    raise ValueError("Unknown algorithm {}".format(algorithm))
+
+
+def init_worker(algorithm: str, weight: float, cache_path=None):
+    # the solver is built in the worker, only its name and weight have to be pickled.
+    # every worker opens its own connection to the solution cache
+    global worker_solve, worker_algorithm, worker_cache
+    worker_solve = make_solver(algorithm, weight)
+    worker_algorithm = (algorithm, weight)
+    worker_cache = solutions.SolutionCache(cache_path) if cache_path is not None else None
+
+
+def read_boards(file) -> Iterator[str]:
+    # boards in BoardState.from_string format separated by blank lines, lines starting with # are comments
+    lines = []
+    for line in file:
+        if line.lstrip().startswith("#"):
+            continue
+        if line.strip():
+            lines.append(line)
+        elif lines:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def solve_board(index: int, text: str, timeout: float = None) -> dict:
+    result = {"index": index, "solved": False, "moves": None,
+              "depth": None, "expanded": None, "time": None}
+
+    try:
+        board = BoardState.from_string(text)
+    except Exception as error:
+        result["error"] = str(error)
+        return result
+
+    stats = {}
+
+    def solve():
+        if worker_cache is None:
+            return worker_solve(board, stats)
+        algorithm, weight = worker_algorithm
+        hits = worker_cache.hits
+        # only ida* with the admissible heuristic and no weight finds shortest solutions
+        node = worker_cache.solve(board, lambda board: worker_solve(board, stats),
+                                  "{} x{}".format(algorithm, weight), optimal=algorithm == "ida" and weight == 1)
+        result["cached"] = worker_cache.hits > hits
+        return node
+
+    start = time.time()
+    try:
+        node = search.run_with_timeout(solve, timeout)
+    except TimeoutError:
+        node = None
+        result["timeout"] = True
+    except Exception as error:
+        # one board that breaks the solver (or the cache) doesn't take the rest of the batch with it
+        node = None
+        result["error"] = repr(error)
+
+    result["time"] = time.time() - start
+    result["expanded"] = stats.get("expanded", 0)
+    if node is not None:
+        result["solved"] = True
+        result["moves"] = search.path_moves(search.get_path(node))
+        result["depth"] = node.depth()
+    return result
+
+
+def solve_all(boards: Iterator[str], out, jobs: int = None, timeout: float = None, algorithm="astar", weight=1.8, cache_path=None):
+    # results are written as soon as they finish, so they can come out of order
+    if jobs is None:
+        jobs = os.cpu_count()
+
+    with ProcessPoolExecutor(jobs, mp_context=pool_context(), initializer=init_worker,
+                             initargs=(algorithm, weight, cache_path)) as pool:
+        pending = set()
+        for index, text in enumerate(boards):
+            # only a few boards per worker are read ahead
+            if len(pending) >= jobs * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write_results(done, out)
+            pending.add(pool.submit(solve_board, index, text, timeout))
+
+        done, _ = wait(pending)
+        write_results(done, out)
+
+
+def write_results(futures, out):
+    for result in sorted((future.result() for future in futures), key=lambda result: result["index"]):
+        out.write(json.dumps(result) + "\n")
+    out.flush()
+
+
+def write_pack(out, width: int, height: int, count: int, seed=0, div=2, min_difficulty=0):
+    # each board is preceded by a comment with its seed and score, boards are written as they are found
+    for board_seed, board, difficulty, depth in generator.puzzle_pack(width, height, count, seed, div, min_difficulty):
+        out.write("# seed {} difficulty {} depth {}\n".format(board_seed, difficulty, depth))
+        out.write(board.to_string() + "\n")
+        out.flush()
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(prog="cohesion")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve = commands.add_parser("solve", help="solve every board in a file")
+    solve.add_argument("--input", default="-",
+                       help="boards separated by blank lines, - for stdin")
+    solve.add_argument("--out", default="-",
+                       help="json lines file, - for stdout")
+    solve.add_argument("--jobs", type=int, default=os.cpu_count())
+    solve.add_argument("--timeout", type=float, default=None,
+                       help="seconds per board")
+    solve.add_argument("--algorithm", choices=ALGORITHMS, default="astar")
+    solve.add_argument("--weight", type=float, default=1.8)
+    solve.add_argument("--cache", help="sqlite file with solutions to reuse and add to")
+
+    generate = commands.add_parser("generate", help="write seeded solvable boards")
+    generate.add_argument("--count", type=int, default=10)
+    generate.add_argument("--width", type=int, default=6)
+    generate.add_argument("--height", type=int, default=6)
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--div", type=float, default=2,
+                          help="about 1/div of the cells are filled")
+    generate.add_argument("--min-difficulty", type=int, default=0,
+                          help="nodes the reference solver has to expand")
+    generate.add_argument("--out", default="-")
+
+    options = parser.parse_args(args)
+
+    if options.command == "generate":
+        out = sys.stdout if options.out == "-" else open(options.out, "w")
+        try:
+            write_pack(out, options.width, options.height, options.count,
+                       options.seed, options.div, options.min_difficulty)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return
+
+    input_file = sys.stdin if options.input == "-" else open(options.input)
+    out = sys.stdout if options.out == "-" else open(options.out, "w")
+    try:
+        solve_all(read_boards(input_file), out, options.jobs,
+                  options.timeout, options.algorithm, options.weight, options.cache)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if out is not sys.stdout:
+            out.close()
+
+# tests
+
+
+def test_solve_file(tmp_path):
+    import boards
+
+    boards_path = tmp_path / "boards.txt"
+    out_path = tmp_path / "results.jsonl"
+    boards_path.write_text("\n".join([
+        "RG..\n....\nR..G\n",
+        "R.\n.X\n",
+        boards.hard_3.to_string(),
+        "R...\n....\n....\n...R\n",
+    ]))
+
+    main(["solve", "--input", str(boards_path), "--out",
+         str(out_path), "--jobs", "2", "--timeout", "30"])
+
+    results = [json.loads(line) for line in out_path.read_text().splitlines()]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert [result["solved"] for result in results] == [True, False, True, True]
+    assert "error" in results[1]
+
+    # replaying the moves solves the board
+    board = boards.hard_3
+    for x, y, direction in results[2]["moves"]:
+        board = board.move_piece(board.pos_piece_map[(x, y)], Direction[direction])
+    assert board.is_win() and results[2]["depth"] == len(results[2]["moves"])
+
+
+def test_generated_pack_is_solved(tmp_path):
+    pack_path = tmp_path / "pack.txt"
+    out_path = tmp_path / "results.jsonl"
+    main(["generate", "--count", "3", "--width", "5", "--height", "5", "--seed", "1", "--out", str(pack_path)])
+    assert pack_path.read_text().startswith("# seed ")
+
+    main(["solve", "--input", str(pack_path), "--out", str(out_path), "--jobs", "2"])
+    results = [json.loads(line) for line in out_path.read_text().splitlines()]
+    assert len(results) == 3 and all(result["solved"] for result in results)
+
+
+def test_timeout():
+    import boards
+
+    init_worker("ida", 1)
+    result = solve_board(0, boards.hard_big_4.to_string(), timeout=0.2)
+    assert result["timeout"] and not result["solved"] and result["time"] < 5
+
+
+def test_solve_with_cache(tmp_path):
+    import boards
+
+    boards_path = tmp_path / "boards.txt"
+    cache_path = tmp_path / "solutions.sqlite"
+    boards_path.write_text("\n".join([boards.hard_3.to_string(), boards.easy_1.to_string()]))
+
+    results = []
+    for run in range(2):
+        out_path = tmp_path / "results{}.jsonl".format(run)
+        main(["solve", "--input", str(boards_path), "--out", str(out_path), "--jobs", "1", "--cache", str(cache_path)])
+        results.append([json.loads(line) for line in out_path.read_text().splitlines()])
+
+    assert [result["cached"] for result in results[0]] == [False, False]
+    assert [result["cached"] for result in results[1]] == [True, True]
+    assert [result["moves"] for result in results[0]] == [result["moves"] for result in results[1]]
+
+
+def test_failing_board_keeps_the_batch(tmp_path):
+    import boards
+
+    # too wide for the binary encoding the cache keys use
+    wide = "\n".join(["R" + "." * 299, "." * 300, "." * 299 + "R"]) + "\n"
+    boards_path = tmp_path / "boards.txt"
+    out_path = tmp_path / "results.jsonl"
+    boards_path.write_text("\n".join([boards.easy_1.to_string(), wide, boards.hard_3.to_string()]))
+
+    main(["solve", "--input", str(boards_path), "--out", str(out_path), "--jobs", "1",
+          "--cache", str(tmp_path / "solutions.sqlite")])
+    results = [json.loads(line) for line in out_path.read_text().splitlines()]
+    assert [result["solved"] for result in results] == [True, False, True]
+    assert "too big" in results[1]["error"] and "error" not in results[0]
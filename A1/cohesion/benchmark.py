@@ -0,0 +1,85 @@
+import os
+import random
+import subprocess
+import sys
+import timeit
+from puzzle import BoardState, Direction, any_overlaps
+
+# micro benchmarks for the hot paths of the solver, run with `python3 cohesion/benchmark.py`
+
+
+def crowded_board(width=10, height=10, min_pieces=30, seed=0) -> BoardState:
+    rng = random.Random(seed)
+    while True:
+        board = BoardState.generate_random(width, height, div=1.5, rng=rng)
+        if board.get_num_pieces() >= min_pieces:
+            return board
+
+
+# the move validation move_piece used to do: rebuild the piece set and intersect every pair
+def pairwise_overlap_moves(board: BoardState) -> int:
+    result = 0
+    for piece in board.pieces:
+        for direction in Direction:
+            if not piece.can_move(direction):
+                continue
+            new_pieces = set(board.pieces) - set([piece]) | set([piece.move(direction)])
+            if not any_overlaps(new_pieces):
+                result += 1
+    return result
+
+
+def occupancy_moves(board: BoardState) -> int:
+    result = 0
+    for piece in board.pieces:
+        for direction in Direction:
+            if board.can_move_piece(piece, direction):
+                result += 1
+    return result
+
+
+def compare_move_validation(board: BoardState, number=20):
+    print("Move validation on a {}x{} board with {} pieces".format(
+        board.width, board.height, board.get_num_pieces()))
+
+    assert pairwise_overlap_moves(board) == occupancy_moves(board)
+
+    old = timeit.timeit(lambda: pairwise_overlap_moves(board), number=number) / number
+    new = timeit.timeit(lambda: occupancy_moves(board), number=number) / number
+
+    print("Pairwise any_overlaps: {:.3f} ms per board".format(old * 1000))
+    print("Occupancy mask:        {:.3f} ms per board".format(new * 1000))
+    print("Speedup: {:.1f}x".format(old / new))
+
+
+def import_time(modules: str, runs=5) -> float:
+    # seconds spent importing, summed from the self times `python -X importtime` prints, median of a few fresh processes
+    times = []
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + modules],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+        total = 0
+        for line in process.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                self_time = line.split(":", 1)[1].split("|")[0].strip()
+                if self_time.isdigit():
+                    total += int(self_time)
+        times.append(total / 1e6)
+    return sorted(times)[len(times) // 2]
+
+
+def compare_startup():
+    # what a short lived batch worker pays before solving anything
+    print("Startup import time")
+    solver = import_time("search, heuristics")
+    gui = import_time("search, heuristics, graphics")
+
+    print("Solver only (search, heuristics): {:.1f} ms".format(solver * 1000))
+    print("Solver with graphics and pygame:  {:.1f} ms".format(gui * 1000))
+    print("Saved per worker: {:.1f} ms".format((gui - solver) * 1000))
+
+
+if __name__ == "__main__":
+    compare_move_validation(crowded_board())
+    compare_move_validation(crowded_board(20, 20, min_pieces=120), number=2)
+    compare_startup()
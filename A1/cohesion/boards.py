@@ -0,0 +1,114 @@
+from puzzle import BoardState
+
+easy_1 = BoardState.from_string("""
+    .B.
+    RGR
+    .B.
+""")
+
+medium_1 = BoardState.from_string("""
+    ....
+    GBYB
+    BB.G
+    .R..
+""")
+
+hard_1 = BoardState.from_string("""
+        BB.G
+        RRR.
+        RRRB
+        .GB.
+""")
+
+hard_2 = BoardState.from_string("""
+        ..YY
+        BGRY
+        G.G.
+        RGB.
+""")
+
+hard_3 = BoardState.from_string("""
+        GB.B
+        .R..
+        .RR.
+        BRBG
+""")
+
+easy_big_1 = BoardState.from_string("""
+RR  R        Y     .
+.  Y            R  .
+.   G Y B  R G Y   .
+.   G           R R.
+.Y             GR  .
+.                 YY
+.     B   B     R  Y
+R      RY  R  B R  .
+.          R G     .
+.   RBB   Y        .
+""")
+
+hard_big_2 = BoardState.from_string("""
+B GG  RYRB
+R     RBY
+GG YGY
+GBR G
+ RY   G  B
+   BBR
+GYY  YBY B
+RGRBGG
+ RYR  RR
+B      G R
+""")
+
+medium_big = BoardState.from_string("""
+RR  R              .
+.  Y            R  .
+.   G Y    R G Y   .
+.   G           R R.
+.Y             G   .
+.                 YY
+.     B            Y
+R      R   R  B R  .
+.          R G     .
+.   RB    Y        .
+""")
+
+hard_big_3 = BoardState.from_string("""
+BGR   Y R.
+BRY     GG
+R    G Y .
+G   BGRB B
+. Y YYYB .
+. YR  R  R
+.  YR YGYG
+.G Y  R  B
+.B Y GYG .
+Y RYGGB Y.
+""")
+
+hard_big_4 = BoardState.from_string("""
+G   GR   R
+YGYBR BB .
+BYRG YG  G
+R Y   G R.
+GR BG RBYY
+B R  B RYB
+.G BY  BRG
+. GRRB RR.
+.GYY R  B.
+.G  YRBG Y
+""")
+
+# by name, easiest first
+NAMED = {
+    "easy_1": easy_1,
+    "medium_1": medium_1,
+    "hard_1": hard_1,
+    "hard_2": hard_2,
+    "hard_3": hard_3,
+    "easy_big_1": easy_big_1,
+    "hard_big_2": hard_big_2,
+    "medium_big": medium_big,
+    "hard_big_3": hard_big_3,
+    "hard_big_4": hard_big_4,
+}
@@ -0,0 +1,233 @@
+import hashlib
+import math
+import sys
+from array import array
+from puzzle import BoardState, layers_to_bytes
+
+# duplicate detection for the searches: every store has add, `in` and len for boards, memory() in bytes and
+# false_positive_rate(), the chance that a board that was never added is reported as seen (expected, for the
+# hashed stores). with symmetry a store treats boards that only differ by a symmetry as the same board
+#   BoardSet          the boards themselves in a set, fast but it keeps every board alive
+#   PackedSet         exact, the boards' binary encoding
+#   FingerprintTable  64 or 128 bit hashes in an open addressing table backed by an array
+#   BloomFilter       approximate, a fixed number of bits no matter how many boards are added
+
+
+def duplicate_key(symmetry: bool):
+    # the boards, or with symmetry their canonical keys, so a board that is a mirror image, rotation or
+    # recoloring of one already seen counts as a duplicate (it takes as many moves to solve)
+    if symmetry:
+        return lambda board: board.canonical_key
+    return lambda board: board
+
+
+def packed_layers(board: BoardState, symmetry=False) -> bytes:
+    # BoardState.to_bytes, of the canonical layers with symmetry
+    if symmetry:
+        return layers_to_bytes(board.width, board.height, board.canonical_key)
+    return board.to_bytes()
+
+
+def fingerprint(board: BoardState, bits: int, symmetry=False) -> int:
+    # the zobrist hash is already a random 64 bit number, longer or symmetric fingerprints hash the packed layers
+    if bits == 64 and not symmetry:
+        return board.zobrist
+    return int.from_bytes(hashlib.blake2b(packed_layers(board, symmetry), digest_size=bits // 8).digest(), "little")
+
+
+class BoardSet:
+    def __init__(self, symmetry=False):
+        self.symmetry = symmetry
+        self.key = duplicate_key(symmetry)
+        self.items = set()
+
+    def add(self, board: BoardState):
+        self.items.add(self.key(board))
+
+    def __contains__(self, board: BoardState) -> bool:
+        return self.key(board) in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def memory(self) -> int:
+        # only the set, the boards are counted with the search tree that holds them too
+        return sys.getsizeof(self.items)
+
+    def false_positive_rate(self) -> float:
+        return 0.0
+
+
+class PackedSet:
+    def __init__(self, symmetry=False):
+        self.symmetry = symmetry
+        self.items = set()
+        self.item_bytes = 0
+
+    def add(self, board: BoardState):
+        packed = packed_layers(board, self.symmetry)
+        if packed not in self.items:
+            self.items.add(packed)
+            self.item_bytes += sys.getsizeof(packed)
+
+    def __contains__(self, board: BoardState) -> bool:
+        return packed_layers(board, self.symmetry) in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def memory(self) -> int:
+        return sys.getsizeof(self.items) + self.item_bytes
+
+    def false_positive_rate(self) -> float:
+        return 0.0
+
+
+class FingerprintTable:
+    # linear probing over a power of two number of slots, each slot is bits / 64 words of an array of
+    # unsigned 64 bit ints and all zero words mark an empty slot. the table doubles when it is half full
+    def __init__(self, bits=64, capacity=1 << 12, symmetry=False):
+        if bits not in (64, 128):
+            raise ValueError("Fingerprints have 64 or 128 bits")
+        self.bits = bits
+        self.words = bits // 64
+        self.symmetry = symmetry
+        self.capacity = capacity
+        self.slots = array("Q", bytes(8 * self.words * capacity))
+        self.count = 0
+
+    def split(self, board: BoardState) -> list[int]:
+        value = fingerprint(board, self.bits, self.symmetry) or 1  # never all zero
+        return [(value >> (64 * i)) & 0xFFFFFFFFFFFFFFFF for i in range(self.words)]
+
+    def find(self, words: list[int]) -> tuple[int, bool]:
+        # (index of the slot with the fingerprint or of the empty slot it would go in, whether it is there)
+        mask = self.capacity - 1
+        index = words[0] & mask
+        while True:
+            start = index * self.words
+            if self.slots[start] == 0 and self.slots[start + self.words - 1] == 0:
+                return index, False
+            if self.slots[start:start + self.words].tolist() == words:
+                return index, True
+            index = (index + 1) & mask
+
+    def add(self, board: BoardState):
+        words = self.split(board)
+        index, found = self.find(words)
+        if found:
+            return
+        self.slots[index * self.words:(index + 1) * self.words] = array("Q", words)
+        self.count += 1
+        if self.count * 2 > self.capacity:
+            self.grow()
+
+    def grow(self):
+        old = self.slots
+        self.capacity *= 2
+        self.slots = array("Q", bytes(8 * self.words * self.capacity))
+        for start in range(0, len(old), self.words):
+            words = old[start:start + self.words].tolist()
+            if any(words):
+                index, _ = self.find(words)
+                self.slots[index * self.words:(index + 1) * self.words] = array("Q", words)
+
+    def __contains__(self, board: BoardState) -> bool:
+        return self.find(self.split(board))[1]
+
+    def __len__(self):
+        return self.count
+
+    def memory(self) -> int:
+        return len(self.slots) * self.slots.itemsize
+
+    def false_positive_rate(self) -> float:
+        # a new board matches one of the stored fingerprints by chance
+        return self.count / 2 ** self.bits
+
+
+class BloomFilter:
+    # `hashes` bits per board out of `bits`, the positions come from one 64 bit fingerprint by double hashing.
+    # a board that was added is always found, one that wasn't is found with false_positive_rate()
+    def __init__(self, bits=1 << 23, hashes=4, symmetry=False):
+        self.bits = bits
+        self.hashes = hashes
+        self.symmetry = symmetry
+        self.filter = bytearray((bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, board: BoardState) -> list[int]:
+        value = fingerprint(board, 64, self.symmetry)
+        first, step = value & 0xFFFFFFFF, (value >> 32) | 1
+        return [(first + i * step) % self.bits for i in range(self.hashes)]
+
+    def add(self, board: BoardState):
+        for position in self.positions(board):
+            self.filter[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, board: BoardState) -> bool:
+        return all(self.filter[position >> 3] >> (position & 7) & 1 for position in self.positions(board))
+
+    def __len__(self):
+        # boards added, the ones added twice count twice
+        return self.count
+
+    def memory(self) -> int:
+        return len(self.filter)
+
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+STORES = {
+    "set": BoardSet,
+    "exact": PackedSet,
+    "fingerprint": FingerprintTable,
+    "bloom": BloomFilter,
+}
+
+
+def make_store(mode: str, symmetry=False, **options):
+    if mode not in STORES:
+        raise ValueError("Unknown duplicate store {}".format(mode))
+    return STORES[mode](symmetry=symmetry, **options)
+
+# tests
+
+
+def test_stores():
+    import boards
+
+    seen = boards.hard_2.children_predicate()
+    unseen = [grandchild for child in seen for grandchild in child.children_predicate()
+              if grandchild not in seen and grandchild != boards.hard_2]
+
+    for mode in STORES:
+        # a table this small has to grow a few times
+        store = make_store(mode, **({"capacity": 4} if mode == "fingerprint" else {}))
+        for board in seen + seen:
+            store.add(board)
+        assert all(board in store for board in seen)
+        assert store.memory() > 0 and store.false_positive_rate() < 1e-6
+        if mode != "bloom":
+            assert len(store) == len(seen)
+            assert not any(board in store for board in unseen)
+
+    table = FingerprintTable(bits=128, capacity=4)
+    for board in seen:
+        table.add(board)
+    assert all(board in table for board in seen) and not any(board in table for board in unseen)
+
+
+def test_symmetric_stores():
+    board = BoardState.from_string("RR.G\n.B..\nG..B\n..Y.\n")
+    mirrored = BoardState.from_string("G.RR\n..B.\nB..G\n.Y..\n")
+    for mode in STORES:
+        store = make_store(mode, symmetry=True)
+        store.add(board)
+        assert mirrored in store
+
+        store = make_store(mode)
+        store.add(board)
+        assert mirrored not in store
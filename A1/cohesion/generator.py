@@ -0,0 +1,108 @@
+import random
+from typing import Iterator, Optional
+from puzzle import BoardState
+import heuristics
+import search
+
+# seeded board generation for puzzle packs: every board comes from its own random.Random(seed) so it can be
+# rebuilt from its seed, boards a cheap bounded greedy search can't solve are dropped and the rest are
+# scored by how much work the reference solver (the weighted a* the gui uses) needs
+
+
+def board_from_seed(width: int, height: int, seed: int, div=2) -> BoardState:
+    return BoardState.generate_random(width, height, div, random.Random(seed))
+
+
+class EffortLimit(search.SearchObserver):
+    # cancels a search once it popped `limit` nodes
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.popped = 0
+
+    def node_popped(self, node: search.TreeNode, open_size: int, closed_size: int) -> bool:
+        self.popped += 1
+        return self.popped > self.limit
+
+
+def quick_solve(board: BoardState, max_expanded=2000) -> Optional[search.TreeNode]:
+    # None when the board wasn't solved within the budget, it may still be solvable
+    heuristic = search.multi_heuristic([
+        (search.pieces_heuristic, lambda _: 100),
+        (heuristics.attract_heuristic, lambda _: 1),
+    ])
+    return search.greedy_search(board, heuristic, observer=EffortLimit(max_expanded))
+
+
+def score_board(board: BoardState, max_expanded=20000) -> tuple[int, Optional[int]]:
+    # (nodes expanded, solution depth) by the reference solver, the depth is None if it ran out of budget
+    heuristic = heuristics.default_heuristic()
+    stats = {}
+    node = search.a_star(board, heuristic, weight=1.8, stats=stats,
+                         observer=EffortLimit(max_expanded))
+    return stats.get("expanded", 0), node.depth() if node is not None else None
+
+
+def generate_boards(width: int, height: int, seed=0, div=2, max_expanded=2000) -> Iterator[tuple[int, BoardState]]:
+    # endless stream of (seed, board) with the boards the quick solver could solve, already solved ones are skipped
+    while True:
+        board = board_from_seed(width, height, seed, div)
+        if not board.is_win() and quick_solve(board, max_expanded) is not None:
+            yield seed, board
+        seed += 1
+
+
+def puzzle_pack(width: int, height: int, count: int, seed=0, div=2, min_difficulty=0, max_expanded=20000) -> Iterator[tuple[int, BoardState, int, Optional[int]]]:
+    # (seed, board, difficulty, depth) for `count` solvable boards at least min_difficulty hard,
+    # the difficulty is the number of nodes the reference solver expanded
+    # returns right after the last board, asking generate_boards for one more would solve boards for nothing
+    if count <= 0:
+        return
+    produced = 0
+    for board_seed, board in generate_boards(width, height, seed, div):
+        difficulty, depth = score_board(board, max_expanded)
+        if difficulty < min_difficulty:
+            continue
+        produced += 1
+        yield board_seed, board, difficulty, depth
+        if produced == count:
+            return
+
+# tests
+
+
+def test_seeded_boards_are_reproducible():
+    from itertools import islice
+
+    first = list(islice(generate_boards(5, 5, seed=7), 3))
+    assert first == list(islice(generate_boards(5, 5, seed=7), 3))
+
+    for seed, board in first:
+        assert board == board_from_seed(5, 5, seed)
+        assert not board.is_win() and quick_solve(board) is not None
+
+
+def test_puzzle_pack():
+    pack = list(puzzle_pack(5, 5, 4, seed=3, min_difficulty=10))
+    assert len(pack) == 4
+    assert len(set(seed for seed, _, _, _ in pack)) == 4
+    for seed, board, difficulty, depth in pack:
+        assert difficulty >= 10 and depth is not None
+        assert score_board(board) == (difficulty, depth)
+
+
+def test_pack_stops_after_the_last_board(monkeypatch):
+    import sys
+
+    solved = []
+    original = quick_solve
+
+    def counted_quick_solve(board, max_expanded=2000):
+        solved.append(board)
+        return original(board, max_expanded)
+
+    monkeypatch.setattr(sys.modules[__name__], "quick_solve", counted_quick_solve)
+    pack = list(puzzle_pack(5, 5, 2, seed=3))
+    # the last board the quick solver looked at is the last one in the pack
+    assert len(pack) == 2 and solved[-1] == pack[-1][1]
+    assert list(puzzle_pack(5, 5, 0)) == []
+
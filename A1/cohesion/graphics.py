@@ -70,7 +70,7 @@ def draw_board(board: BoardState, screen: pygame.Surface):
     board_properties_text(board, screen)
 
 
-def draw_path(path: list[search.TreeNode], screen: pygame.Surface, time: float, delay=250, heuristic=None):
+def draw_path(path: list['search.TreeNode'], screen: pygame.Surface, time: float, delay=250, heuristic=None):
     for node in path:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -154,3 +154,50 @@ class Button:
         elif event.type == pygame.MOUSEMOTION:
             if not self.rect.collidepoint(event.pos):
                 self.pressed = False
+
+
+def draw_search_debug(node: 'search.TreeNode', screen: pygame.Surface, visited: int = None, heuristic=None) -> bool:
+    for event in pygame.event.get():
+        cancel = False
+        if event.type == pygame.QUIT:
+            cancel = True
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                cancel = True
+
+        if cancel:
+            draw_text("Cancelled", screen,
+                      (screen.get_width() // 2 - 50, 20))
+            return True
+
+    draw_board(node.board, screen)
+    draw_text("Depth: " + str(node.depth()),
+              screen, (screen.get_width() - 200, 0))
+
+    if heuristic is not None:
+        draw_text("Heuristic: " + str(heuristic(node.board, node.depth())),
+                  screen, (screen.get_width() - 200, 20))
+
+    if visited is not None:
+        draw_text("Visited: " + str(visited),
+                  screen, (screen.get_width() - 200, 40))
+    pygame.display.flip()
+
+    return False
+
+
+class DrawObserver(search.SearchObserver):
+    # draws the search at most once every `interval` ms, redrawing the board on every popped node
+    # took far longer than the search itself
+    def __init__(self, screen: pygame.Surface, heuristic=None, interval=50):
+        self.screen = screen
+        self.heuristic = heuristic
+        self.interval = interval
+        self.last_draw = None
+
+    def node_popped(self, node: 'search.TreeNode', open_size: int, closed_size: int) -> bool:
+        now = pygame.time.get_ticks()
+        if self.last_draw is not None and now - self.last_draw < self.interval:
+            return False
+        self.last_draw = now
+        return draw_search_debug(node, self.screen, closed_size, self.heuristic)
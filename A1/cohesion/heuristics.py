@@ -0,0 +1,230 @@
+import numpy as np
+from puzzle import BoardState, Direction, edge_masks, full_mask
+import search
+
+# heuristics that don't fit search.py's piece by piece style:
+#   manhattan_distance_heuristic  numpy version of the one in search.py, same values from whole arrays
+#   repel_heuristic, attract_heuristic  gaps to the nearest piece of another or the same color, from bitboard
+#                                       distance fields instead of comparing every pair of pieces
+#   mst_gap_heuristic  admissible lower bound from a minimum spanning tree of each color's pieces
+#   default_heuristic  the weighted mix the interface, the batch solver, the portfolio, the benchmark suite and
+#                      the generator's difficulty score all solve with
+
+
+def piece_cell_arrays(board: BoardState):
+    # coordinates of every occupied cell grouped by piece, the index where each piece starts and the color of each piece
+    pieces = list(board.pieces)
+    xs, ys, starts, colors = [], [], [], []
+    for piece in pieces:
+        starts.append(len(xs))
+        colors.append(piece.color.value)
+        for x, y in piece.positions:
+            xs.append(x)
+            ys.append(y)
+
+    return np.array(xs), np.array(ys), np.array(starts), np.array(colors)
+
+
+def min_piece_distances(board: BoardState):
+    # matrix with the smallest manhattan distance between the cells of every pair of pieces
+    xs, ys, starts, colors = piece_cell_arrays(board)
+
+    cell_distances = np.abs(xs[:, None] - xs[None, :]) + \
+        np.abs(ys[:, None] - ys[None, :])
+
+    # reduce the rows and then the columns of each piece to their minimum
+    distances = np.minimum.reduceat(cell_distances, starts, axis=0)
+    distances = np.minimum.reduceat(distances, starts, axis=1)
+
+    return distances, colors
+
+
+def manhattan_distance_heuristic(same_color=True):
+    def heuristic(board: BoardState):
+        if board.get_num_pieces() < 2:
+            return 0
+
+        distances, colors = min_piece_distances(board)
+
+        pairs = colors[:, None] == colors[None, :]
+        if not same_color:
+            pairs = ~pairs
+        np.fill_diagonal(pairs, False)
+
+        return int((distances[pairs] - 1).sum())
+
+    return heuristic
+
+
+# distance fields: instead of comparing every pair of pieces, cells are grown one step at a time with bitboard
+# dilations, after k steps a mask covers every cell at manhattan distance <= k from where it started
+
+
+def dilation_masks(width: int, height: int):
+    edges = edge_masks(width, height)
+    return full_mask(width, height), ~edges[Direction.LEFT], ~edges[Direction.RIGHT]
+
+
+def distance_field(sources: int, width: int, height: int) -> list[int]:
+    # ring k holds every cell at distance <= k from the sources
+    board, not_left, not_right = dilation_masks(width, height)
+    rings = [sources]
+    while rings[-1] != board:
+        ring = rings[-1]
+        rings.append(ring | (ring >> width) | ((ring << width) & board) |
+                     ((ring & not_left) >> 1) | ((ring & not_right) << 1))
+    return rings
+
+
+def field_distance(rings: list[int], mask: int) -> int:
+    for distance, ring in enumerate(rings):
+        if ring & mask:
+            return distance
+    raise ValueError("Mask is not on the board")
+
+
+def repel_heuristic(board: BoardState):
+    # sum of the gaps between every piece and its nearest piece of another color,
+    # one field per color built from the cells of all the other colors
+    result = 0
+    for color, layer in board.layers.items():
+        others = board.occupied & ~layer
+        if others == 0:
+            continue
+        rings = distance_field(others, board.width, board.height)
+        for piece in board.pieces:
+            if piece.color == color:
+                result += field_distance(rings, piece.mask) - 1
+    return result
+
+
+def attract_heuristic(board: BoardState):
+    # sum of the gaps between every piece and its nearest piece of the same color,
+    # a piece's own cells are part of its color's field so the pieces of a color are grown side by side
+    # until each one touches the rest of its layer
+    width = board.width
+    full, not_left, not_right = dilation_masks(board.width, board.height)
+
+    growing = [(piece.mask, board.layers[piece.color] & ~piece.mask)
+               for piece in board.pieces if board.layers[piece.color] != piece.mask]
+
+    result = 0
+    distance = 0
+    while growing:
+        distance += 1
+        still_growing = []
+        for reached, others in growing:
+            reached |= (reached >> width) | ((reached << width) & full) | \
+                ((reached & not_left) >> 1) | ((reached & not_right) << 1)
+            if reached & others:
+                result += distance - 1
+            else:
+                still_growing.append((reached, others))
+        growing = still_growing
+
+    return result
+
+
+def mst_gap_heuristic(board: BoardState):
+    # admissible and consistent lower bound on the number of moves left
+    #
+    # for each color take the minimum spanning tree of its pieces weighted by the gaps between them,
+    # the tree's longest edge is a cut between two groups of pieces that must be closed to merge them.
+    # a move shifts a single piece by one cell, so it shortens the gaps of its own color by at most 1
+    # (merging only contracts zero gaps) and leaves the other colors alone, so the sum over colors
+    # drops by at most 1 per move and is 0 exactly on solved boards
+    if board.get_num_pieces() < 2:
+        return 0
+
+    distances, colors = min_piece_distances(board)
+    gaps = distances - 1
+
+    result = 0
+    for color in np.unique(colors):
+        indices = np.flatnonzero(colors == color)
+        if len(indices) < 2:
+            continue
+        result += mst_longest_edge(gaps[np.ix_(indices, indices)])
+
+    return result
+
+
+def mst_longest_edge(weights: np.ndarray) -> int:
+    # prim's algorithm on a dense matrix, keeping only the heaviest edge added
+    size = len(weights)
+    in_tree = np.zeros(size, dtype=bool)
+    in_tree[0] = True
+    best = weights[0].copy()
+    result = 0
+    for _ in range(size - 1):
+        candidates = np.where(in_tree, np.iinfo(best.dtype).max, best)
+        nearest = int(np.argmin(candidates))
+        result = max(result, int(candidates[nearest]))
+        in_tree[nearest] = True
+        best = np.minimum(best, weights[nearest])
+    return result
+
+
+def default_heuristic(cache_size=100000):
+    # a new multi_heuristic (each with its own cache) of the mix tuned on the interface's boards,
+    # every solver uses this one so the benchmark baseline and the difficulty scores follow a retune
+    return search.multi_heuristic([
+        (search.pieces_heuristic, lambda _: 100),
+        (attract_heuristic, lambda _: 1),
+        (repel_heuristic, lambda _: -.2),
+        (search.piece_uniformity_heuristic, lambda _: 15),
+    ], cache_size)
+
+# tests
+
+
+def test_manhattan_matches_search():
+    import boards
+    import search
+
+    for board in [boards.easy_1, boards.medium_1, boards.hard_1, boards.hard_2, boards.hard_3,
+                  boards.easy_big_1, boards.hard_big_2, boards.medium_big, boards.hard_big_3, boards.hard_big_4]:
+        for same_color in [True, False]:
+            expected = search.manhattan_distance_heuristic(same_color)(board)
+            assert manhattan_distance_heuristic(same_color)(board) == expected
+
+        for child in board.children_predicate(lambda b, p: True):
+            for same_color in [True, False]:
+                expected = search.manhattan_distance_heuristic(same_color)(child)
+                assert manhattan_distance_heuristic(same_color)(child) == expected
+
+
+def test_fields_match_nearest_piece():
+    import boards
+    import search
+
+    for board in [boards.hard_1, boards.hard_2, boards.hard_big_2, boards.hard_big_4]:
+        attract, repel = 0, 0
+        for piece in board.pieces:
+            same = [search.manhattan_distance_piece(piece, other) for other in board.pieces
+                    if other != piece and other.color == piece.color]
+            different = [search.manhattan_distance_piece(piece, other) for other in board.pieces
+                         if other.color != piece.color]
+            attract += min(same, default=0)
+            repel += min(different, default=0)
+
+        assert attract_heuristic(board) == attract
+        assert repel_heuristic(board) == repel
+
+
+def test_mst_gap_is_consistent():
+    import boards
+    import search
+
+    for board in [boards.medium_1, boards.hard_1, boards.hard_2, boards.hard_big_2]:
+        for child in board.children_predicate():
+            assert mst_gap_heuristic(board) <= 1 + mst_gap_heuristic(child)
+            assert mst_gap_heuristic(child) <= 1 + mst_gap_heuristic(board)
+
+    # same depth as uniform cost search
+    heuristic = search.multi_heuristic([(mst_gap_heuristic, lambda _: 1)])
+    uniform = search.multi_heuristic([(lambda board: 0, lambda _: 1)])
+    for board in [boards.easy_1, boards.hard_1]:
+        node = search.a_star(board, heuristic, reopen=True)
+        assert mst_gap_heuristic(node.board) == 0
+        assert node.depth() == search.a_star(board, uniform, reopen=True).depth()
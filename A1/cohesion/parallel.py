@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from puzzle import BoardState
+from search import OpenList, TreeNode
+
+# batch a*: the nodes a* is about to expand are expanded ahead on a pool of worker processes,
+# boards travel between processes as BoardState.to_bytes() instead of pickled pieces
+
+# set in each worker by init_worker
+worker_heuristic = None
+
+
+def init_worker(heuristic):
+    global worker_heuristic
+    worker_heuristic = heuristic
+
+
+def expand_batch(jobs: list[tuple[bytes, int]]) -> list[list[tuple[bytes, float, bool]]]:
+    # for every (encoded board, depth) returns its children as (encoded child, heuristic, is win)
+    result = []
+    for encoded, depth in jobs:
+        board = BoardState.from_bytes(encoded)
+        result.append([(child.to_bytes(), worker_heuristic(child, depth + 1), child.is_win())
+                       for child in board.children_predicate(lambda b, p: b.should_move(p))])
+    return result
+
+
+def pool_context():
+    # forked workers inherit the heuristic, other start methods need it to be picklable
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def decode_path(node: TreeNode) -> TreeNode:
+    # the search keeps encoded boards in its nodes, the solution is rebuilt with real boards
+    encoded = []
+    while node is not None:
+        encoded.append(node.board)
+        node = node.parent
+    result = None
+    for board in reversed(encoded):
+        result = TreeNode(BoardState.from_bytes(board), result)
+    return result
+
+
+def batch_a_star(board: BoardState, heuristic, weight=1, batch_size=None, workers=None, depth_limit=None, stats: dict = None):
+    # when a* pops a node that wasn't expanded yet, it and the next batch_size - 1 nodes of the open list are
+    # expanded together (one per worker by default). only the popped node's children go into the open list, the
+    # others keep theirs until a* pops them in turn, so the nodes are expanded in the same order as a_star and
+    # speculation only costs worker time: a node that is never popped is never let into the search
+    if workers is None:
+        workers = os.cpu_count()
+    if batch_size is None:
+        batch_size = workers
+
+    root = TreeNode(board.to_bytes())
+    if board.is_win():
+        return decode_path(root)
+
+    open_list = OpenList()
+    open_list.push(root, heuristic(board, 0) * weight)
+    visited = set([root.board])  # encoded boards, to not visit the same state twice
+    speculated = {}  # children of the nodes expanded ahead, until they are popped
+    expanded = 0
+    sent = 0
+
+    def finish(result):
+        if stats is not None:
+            stats["expanded"] = expanded
+            stats["speculative"] = sent - expanded
+        return result
+
+    def expandable(node):
+        return depth_limit is None or node.depth() + 1 < depth_limit
+
+    with ProcessPoolExecutor(workers, mp_context=pool_context(), initializer=init_worker, initargs=(heuristic,)) as pool:
+        while open_list:
+            node = open_list.pop()
+            if not expandable(node):
+                continue
+
+            children = speculated.pop(node, None)
+            if children is None:
+                batch = [node] + [ahead for ahead in open_list.peek(batch_size - 1)
+                                  if ahead not in speculated and expandable(ahead)]
+                # one chunk per worker so each process gets a single message per batch
+                chunks = [batch[i::workers] for i in range(workers)]
+                chunks = [chunk for chunk in chunks if chunk]
+                results = pool.map(
+                    expand_batch, [[(ahead.board, ahead.depth()) for ahead in chunk] for chunk in chunks])
+                sent += len(batch)
+                for chunk, chunk_children in zip(chunks, results):
+                    speculated.update(zip(chunk, chunk_children))
+                children = speculated.pop(node)
+
+            expanded += 1
+            for encoded, h, win in children:
+                if encoded in visited:
+                    continue
+                visited.add(encoded)
+
+                child = TreeNode(encoded, parent=node)
+                if win:
+                    return finish(decode_path(child))
+                open_list.push(child, child.depth() + h * weight)
+
+    return finish(None)
+
+# tests
+
+
+def test_batch_a_star():
+    import boards
+    import search
+
+    heuristic = search.multi_heuristic([(search.pieces_heuristic, lambda _: 100),
+                                        (search.manhattan_distance_heuristic(), lambda _: 1)])
+    node = batch_a_star(boards.hard_3, heuristic, batch_size=8, workers=2)
+
+    path = search.get_path(node)
+    assert path[0].board == boards.hard_3 and path[-1].board.is_win()
+    for parent, child in zip(path, path[1:]):
+        assert child.board in parent.board.children_predicate()
+
+
+def test_batches_expand_like_a_star():
+    import boards
+    import search
+
+    heuristic = search.multi_heuristic([(search.pieces_heuristic, lambda _: 100),
+                                        (search.manhattan_distance_heuristic(), lambda _: 1)])
+    expected = {}
+    search.a_star(boards.hard_3, heuristic, stats=expected)
+
+    # nodes expanded ahead only cost worker time, the search expands what a* does however big the batches are
+    for workers, batch_size in [(1, None), (2, None), (2, 64)]:
+        stats = {}
+        node = batch_a_star(boards.hard_3, heuristic, batch_size=batch_size, workers=workers, stats=stats)
+        assert node.board.is_win() and stats["expanded"] == expected["expanded"]
+    assert stats["speculative"] > 0
+
+
+def test_deep_paths_are_decoded():
+    node = None
+    for _ in range(5000):
+        node = TreeNode(BoardState.from_string("R.R\n").to_bytes(), node)
+    assert decode_path(node).depth() == 4999
+
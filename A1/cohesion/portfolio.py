@@ -0,0 +1,170 @@
+import _thread
+import json
+import queue
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Optional
+from puzzle import BoardState
+from parallel import pool_context
+import heuristics
+import search
+
+# portfolio: several search configurations race on the same board, each in its own process,
+# the first one to find a solution wins and the others are cancelled
+
+
+def default_configs() -> list[tuple[str, callable]]:
+    # (name, function from a board to a solution node)
+    heuristic = heuristics.default_heuristic()
+    admissible = search.multi_heuristic(
+        [(heuristics.mst_gap_heuristic, lambda _: 1)])
+
+    return [
+        ("Weighted A* (x1.8)", lambda board: search.a_star(board, heuristic, weight=1.8)),
+        ("Weighted A* (x3)", lambda board: search.a_star(board, heuristic, weight=3)),
+        ("Greedy", lambda board: search.greedy_search(board, heuristic)),
+        ("Beam (200)", lambda board: search.beam_search(board, heuristic, beam_width=200)),
+        ("IDA* (MST gaps)", lambda board: search.ida_star(board, admissible)),
+    ]
+
+
+def run_config(name: str, solve, encoded, cancel, results):
+    # runs in a worker process, a watcher thread interrupts the search once another config has won
+    def watch():
+        # polled instead of cancel.wait(), Event.set() blocks on waiters that already exited
+        while not cancel.is_set():
+            time.sleep(0.05)
+        _thread.interrupt_main()
+
+    threading.Thread(target=watch, daemon=True).start()
+
+    path = None
+    try:
+        node = solve(BoardState.from_bytes(encoded))
+        if node is not None:
+            path = [n.board.to_bytes() for n in search.get_path(node)]
+    except KeyboardInterrupt:
+        return
+    except Exception:
+        # a failing config counts as one without a solution, so the others still get waited for
+        traceback.print_exc()
+
+    results.put((name, path))
+
+
+def solve_portfolio(board: BoardState, configs: list[tuple[str, callable]] = None, timeout=None, log_path=None) -> Optional[tuple[search.TreeNode, str]]:
+    # returns the first solution found and the name of the config that found it
+    if configs is None:
+        configs = default_configs()
+
+    context = pool_context()
+    cancel = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=run_config, args=(name, solve, board.to_bytes(), cancel, results), daemon=True)
+                 for name, solve in configs]
+
+    start = time.time()
+    for process in processes:
+        process.start()
+
+    winner = None
+    remaining = len(processes)
+    while remaining > 0 and winner is None:
+        # polled, a process that died without reporting (killed, out of memory) would block get() forever.
+        # whether any is alive is checked before the get, so a result put right before exiting is still read
+        alive = any(process.is_alive() for process in processes)
+        left = None if timeout is None else timeout - (time.time() - start)
+        try:
+            name, path = results.get(timeout=0.1 if left is None else max(0, min(0.1, left)))
+        except queue.Empty:
+            if not alive or (left is not None and left <= 0):
+                break
+            continue
+        remaining -= 1
+        if path is not None:
+            winner = (name, path)
+
+    cancel.set()
+    for process in processes:
+        process.join(1)
+        if process.is_alive():
+            process.terminate()
+
+    if winner is None:
+        return None
+
+    name, path = winner
+    node = None
+    for encoded in path:
+        node = search.TreeNode(BoardState.from_bytes(encoded), node)
+
+    if log_path is not None:
+        record_win(log_path, board, name, node.depth(), time.time() - start)
+
+    return node, name
+
+
+def record_win(log_path, board: BoardState, name: str, depth: int, duration: float):
+    with open(log_path, "a") as file:
+        file.write(json.dumps({
+            "width": board.width,
+            "height": board.height,
+            "pieces": board.get_num_pieces(),
+            "config": name,
+            "depth": depth,
+            "time": duration,
+        }) + "\n")
+
+
+def wins_by_board_size(log_path) -> dict[tuple[int, int], Counter]:
+    # how often each config won for every board size recorded in the log
+    result = {}
+    with open(log_path) as file:
+        for line in file:
+            entry = json.loads(line)
+            size = (entry["width"], entry["height"])
+            result.setdefault(size, Counter())[entry["config"]] += 1
+    return result
+
+# tests
+
+
+def test_first_solution_wins(tmp_path):
+    import boards
+
+    heuristic = search.multi_heuristic([(search.pieces_heuristic, lambda _: 1)])
+
+    def never_finishes(board):
+        while True:
+            time.sleep(0.1)
+
+    log_path = tmp_path / "wins.jsonl"
+    node, name = solve_portfolio(boards.hard_3, [
+        ("Sleeper", never_finishes),
+        ("Greedy", lambda board: search.greedy_search(board, heuristic)),
+    ], timeout=60, log_path=log_path)
+
+    assert name == "Greedy"
+    assert search.get_path(node)[0].board == boards.hard_3 and node.board.is_win()
+    assert wins_by_board_size(log_path) == {(4, 4): Counter({"Greedy": 1})}
+
+
+def test_failing_config():
+    import boards
+
+    heuristic = search.multi_heuristic([(search.pieces_heuristic, lambda _: 1)])
+
+    def fails(board):
+        raise ValueError("broken config")
+
+    start = time.time()
+    assert solve_portfolio(boards.hard_3, [("Broken", fails)]) is None
+    assert time.time() - start < 30
+
+    node, name = solve_portfolio(boards.hard_3, [
+        ("Broken", fails),
+        ("Greedy", lambda board: search.greedy_search(board, heuristic)),
+    ])
+    assert name == "Greedy" and node.board.is_win()
@@ -1,5 +1,7 @@
 from enum import Enum
-from typing import Callable, Optional
+from functools import cached_property, lru_cache
+from itertools import chain, compress
+from typing import Callable, Iterator, Optional
 import random
 
 
@@ -17,6 +19,11 @@ class Color(Enum):
     BLUE = 34
     YELLOW = 33
 
+    # enums hash their name, which is slower and differs between processes (string hashes are randomized),
+    # with the value the iteration order of the piece sets and so every search is the same in every run
+    def __hash__(self):
+        return self._value_
+
     def get_color_rgb(self):
         if self == Color.RED:
             return (255, 0, 0)
@@ -59,36 +66,304 @@ def shift_pos(pos: tuple[int, int], direction: Direction, amount: int = 1) -> tu
         raise Exception("Invalid direction")
 
 
+# bitboards: a set of cells is stored as an int where bit (y * width + x) is set for every (x, y) in it
+
+
+def position_bit(x: int, y: int, width: int) -> int:
+    return 1 << (y * width + x)
+
+
+def positions_to_mask(positions, width: int) -> int:
+    mask = 0
+    for x, y in positions:
+        mask |= position_bit(x, y, width)
+    return mask
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    # yields the index of every set bit, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_to_positions(mask: int, width: int) -> list[tuple[int, int]]:
+    return [(i % width, i // width) for i in iter_bits(mask)]
+
+
+@lru_cache(maxsize=None)
+def full_mask(width: int, height: int) -> int:
+    return (1 << (width * height)) - 1
+
+
+@lru_cache(maxsize=None)
+def edge_masks(width: int, height: int) -> dict[Direction, int]:
+    # cells that would leave the board when moved in each direction
+    row = (1 << width) - 1
+    column = sum(1 << (y * width) for y in range(height))
+    return {
+        Direction.UP: row,
+        Direction.DOWN: row << ((height - 1) * width),
+        Direction.LEFT: column,
+        Direction.RIGHT: column << (width - 1),
+    }
+
+
+def shift_mask(mask: int, direction: Direction, width: int) -> int:
+    # does not check the edges, cells on the edge wrap around or fall off the board
+    if direction == Direction.UP:
+        return mask >> width
+    elif direction == Direction.DOWN:
+        return mask << width
+    elif direction == Direction.LEFT:
+        return mask >> 1
+    elif direction == Direction.RIGHT:
+        return mask << 1
+    else:
+        raise Exception("Invalid direction")
+
+
+def neighbour_mask(mask: int, width: int, height: int) -> int:
+    # cells on the board orthogonally adjacent to the mask, not including the mask itself
+    edges = edge_masks(width, height)
+    result = (mask >> width) | ((mask << width) & full_mask(width, height)) | \
+        ((mask & ~edges[Direction.LEFT]) >> 1) | ((mask & ~edges[Direction.RIGHT]) << 1)
+    return result & ~mask
+
+
+# deadlocks: a piece that touches two opposite edges splits the rest of the board into regions no other piece
+# can ever leave. a piece touching the left and right edges can only move up and down and it stays in one
+# piece as it moves and grows by merging, a piece that crosses it would have to go through one of its cells.
+# the region above it, the region below it and every pocket enclosed by it are kept apart for good,
+# so a color (other than the piece's) with pieces in two of them can't be solved anymore
+
+
+def flood_fill(seed: int, free: int, width: int, height: int) -> int:
+    # cells of free connected to the seed cells
+    region = seed & free
+    while True:
+        grown = (region | neighbour_mask(region, width, height)) & free
+        if grown == region:
+            return region
+        region = grown
+
+
+def spans_board(mask: int, width: int, height: int) -> bool:
+    # touches two opposite edges
+    edges = edge_masks(width, height)
+    return bool((mask & edges[Direction.LEFT] and mask & edges[Direction.RIGHT]) or
+                (mask & edges[Direction.UP] and mask & edges[Direction.DOWN]))
+
+
+@lru_cache(maxsize=1 << 16)
+def separated_regions(mask: int, width: int, height: int) -> tuple[tuple[int, ...], ...]:
+    # the regions kept apart by a piece, once for each pair of opposite edges it touches.
+    # a move only changes the pieces of one color, so most pieces of a child were already looked up here
+    edges = edge_masks(width, height)
+    free = full_mask(width, height) & ~mask
+    result = []
+    for (a, b), (c, d) in [((Direction.LEFT, Direction.RIGHT), (Direction.UP, Direction.DOWN)),
+                           ((Direction.UP, Direction.DOWN), (Direction.LEFT, Direction.RIGHT))]:
+        if mask & edges[a] and mask & edges[b]:
+            # the sides along the other two edges, when the piece moves along them the cells that show up
+            # next to the edge connect everything on that side
+            first = flood_fill(edges[c], free, width, height)
+            second = flood_fill(edges[d], free, width, height)
+            pockets = split_components(free & ~first & ~second, width, height)
+            result.append(tuple(region for region in [first, second] + list(pockets) if region))
+    return tuple(result)
+
+
+@lru_cache(maxsize=None)
+def half_planes(width: int, height: int) -> dict[Direction, list[int]]:
+    # for every direction and row (up/down) or column (left/right) the cells strictly past it in that direction
+    column = sum(1 << (y * width) for y in range(height))
+    full = full_mask(width, height)
+    return {
+        Direction.UP: [(1 << (y * width)) - 1 for y in range(height)],
+        Direction.DOWN: [full & ~((1 << ((y + 1) * width)) - 1) for y in range(height)],
+        Direction.LEFT: [sum(column << i for i in range(x)) for x in range(width)],
+        Direction.RIGHT: [sum(column << i for i in range(x + 1, width)) for x in range(width)],
+    }
+
+
+# symmetry: the rules don't depend on how the board is oriented or on which color is which, boards that are
+# mirror images, rotations (square boards only) or recolorings of each other take the same number of moves
+
+
+def canonical_layers(layers, width: int, height: int) -> tuple[int, ...]:
+    # the same key for every board in a symmetry class. each layer is written as a string of its cells
+    # (cell 0 first) so the transforms are slices, the layers of each transformed board are sorted by their
+    # first cell (the layers are disjoint, so that is a reverse string sort), which relabels the colors
+    # by first appearance, and the smallest transformed board is the key
+    size = width * height
+    cells = [format(layer, "0{}b".format(size))[::-1] for layer in layers]
+
+    def upside_down(string):
+        return "".join([string[y * width:(y + 1) * width] for y in range(height - 1, -1, -1)])
+
+    # identity, rotated by 180 degrees, flipped vertically and flipped horizontally
+    variants = [cells, [string[::-1] for string in cells]]
+    variants += [[upside_down(string) for string in variant] for variant in variants]
+    if width == height:
+        # transposed, the other four symmetries of a square
+        variants += [["".join([string[x::width] for x in range(width)]) for string in variant]
+                     for variant in variants]
+    best = min(tuple(sorted(variant, reverse=True)) for variant in variants)
+    return tuple(int(string, 2) for string in best)
+
+
+# zobrist hashing: a random 64 bit number per (cell, color), a board hashes to the xor of its occupied cells
+ZOBRIST_SEED = 0x5EED
+
+
+@lru_cache(maxsize=None)
+def zobrist_table(width: int, height: int) -> dict[Color, list[int]]:
+    rng = random.Random(ZOBRIST_SEED)
+    return {color: [rng.getrandbits(64) for _ in range(width * height)] for color in Color}
+
+
+def zobrist_hash(mask: int, color: Color, width: int, height: int) -> int:
+    table = zobrist_table(width, height)[color]
+    result = 0
+    for i in iter_bits(mask):
+        result ^= table[i]
+    return result
+
+
+def split_components(mask: int, width: int, height: int) -> list[int]:
+    # splits a mask into its orthogonally connected components, ordered by their lowest cell.
+    # one pass over the cells, lowest first: a cell joins its left neighbour's component and merges it with
+    # its upper neighbour's, every component is named after its lowest cell (union-find without ranks)
+    parent = {}
+    for i in iter_bits(mask):
+        root = i
+        if i % width and i - 1 in parent:
+            root = parent[i - 1]
+            while parent[root] != root:
+                root = parent[root]
+        parent[i] = root
+        if i - width in parent:
+            other = parent[i - width]
+            while parent[other] != other:
+                other = parent[other]
+            if other != root:
+                low, high = min(other, root), max(other, root)
+                parent[high] = low
+                parent[i] = low
+
+    components = {}
+    for i in parent:
+        root = parent[i]
+        while parent[root] != root:
+            root = parent[root]
+        components[root] = components.get(root, 0) | 1 << i
+    return list(components.values())
+
+
+# binary format: width and height as one byte each, a bitplane with the occupied cells (ceil(cells / 8) bytes)
+# and then 2 bits per occupied cell for its color (its index in Color), lowest cell first, all little endian.
+# empty cells take 1 bit, five states a cell wouldn't fit in 2 bits. a 10x10 board half full takes 28 bytes
+
+
+# both directions work on the masks written as strings of 0 and 1 (highest cell first): the color bits of the
+# occupied cells are picked out with itertools.compress and put back by splitting on the occupied cells,
+# so no loop runs in python for every cell
+
+SELECTORS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def layers_to_bytes(width: int, height: int, layers) -> bytes:
+    # layers in Color order, missing ones are empty
+    if width > 255 or height > 255:
+        raise Exception("Board too big to encode: {}x{}".format(width, height))
+    layers = list(layers) + [0] * (len(Color) - len(layers))
+    digits = "0{}b".format(width * height)
+    occupied = layers[0] | layers[1] | layers[2] | layers[3]
+    selectors = format(occupied, digits).encode().translate(SELECTORS)
+    low = bytes(compress(format(layers[1] | layers[3], digits).encode(), selectors))
+    high = bytes(compress(format(layers[2] | layers[3], digits).encode(), selectors))
+
+    codes = bytearray(len(low) * 2)
+    codes[0::2] = high
+    codes[1::2] = low
+    return bytes([width, height]) + occupied.to_bytes((width * height + 7) // 8, "little") + \
+        (int(codes, 2) if codes else 0).to_bytes((len(codes) + 7) // 8, "little")
+
+
+def bytes_to_layers(data: bytes) -> tuple[int, int, list[int]]:
+    if len(data) < 2 or data[0] == 0 or data[1] == 0:
+        raise Exception("Invalid board bytes")
+    width, height = data[0], data[1]
+    size = (width * height + 7) // 8
+    occupied = int.from_bytes(data[2:2 + size], "little")
+    count = occupied.bit_count()
+    codes = int.from_bytes(data[2 + size:], "little")
+    if len(data) != 2 + size + (count * 2 + 7) // 8 or occupied >> (width * height) or codes >> (count * 2):
+        raise Exception("Invalid board bytes")
+
+    gaps = format(occupied, "0{}b".format(width * height)).split("1")
+    codes = format(codes, "0{}b".format(count * 2))
+
+    def spread(bits):
+        # the bits of the occupied cells back in their places
+        return int("".join(chain.from_iterable(zip(gaps, bits))) + gaps[-1], 2)
+
+    low, high = spread(codes[1::2]), spread(codes[0::2])
+    return width, height, [occupied & ~low & ~high, low & ~high, high & ~low, low & high]
+
+
 class Piece:
-    def __init__(self, color: Color, positions: set[(int, int)]):
+    def __init__(self, color: Color, mask: int, width: int, height: int):
         self.color = color
-        self.positions = frozenset(positions)
+        self.mask = mask
+        self.width = width
+        self.height = height
+
+    @staticmethod
+    def from_positions(color: Color, positions: set[(int, int)], width: int, height: int) -> 'Piece':
+        return Piece(color, positions_to_mask(positions, width), width, height)
+
+    @cached_property
+    def positions(self) -> frozenset[(int, int)]:
+        # decoded lazily, only the gui and some heuristics need the cells as tuples
+        return frozenset(mask_to_positions(self.mask, self.width))
+
+    @cached_property
+    def bounds(self) -> tuple[int, int, int, int]:
+        # (min x, min y, max x, max y), the columns come from or-ing the rows together
+        row = (1 << self.width) - 1
+        columns = 0
+        mask = self.mask
+        while mask:
+            columns |= mask & row
+            mask >>= self.width
+        return ((columns & -columns).bit_length() - 1, ((self.mask & -self.mask).bit_length() - 1) // self.width,
+                columns.bit_length() - 1, (self.mask.bit_length() - 1) // self.width)
 
     def __eq__(self, other):
-        return self.color == other.color and self.positions == other.positions
+        return self.color == other.color and self.mask == other.mask
 
     def __hash__(self):
-        return hash((self.color, self.positions))
+        return hash((self.color, self.mask))
 
     def overlaps(self, other) -> bool:
-        return len(self.positions & other.positions) > 0
+        return self.mask & other.mask != 0
+
+    def get_neighbour_mask(self) -> int:
+        return neighbour_mask(self.mask, self.width, self.height)
 
     def get_neighbour_positions(self) -> set[(int, int)]:
-        result = set([])
-        for x, y in self.positions:
-            for direction in Direction:
-                pos = shift_pos((x, y), direction)
-                if pos not in self.positions:
-                    result.add(pos)
-        return result
+        return set(mask_to_positions(self.get_neighbour_mask(), self.width))
+
+    def can_move(self, direction: Direction) -> bool:
+        return self.mask & edge_masks(self.width, self.height)[direction] == 0
 
     # returns a new piece that is moved in the given direction, does not check if it stays on the board
+    # (use can_move first, cells on the edge would wrap around or fall off)
     def move(self, direction: Direction) -> 'Piece':
-        new_positions = set([])
-        for x, y in self.positions:
-            new_positions.add(shift_pos((x, y), direction))
-
-        return Piece(self.color, new_positions)
+        return Piece(self.color, shift_mask(self.mask, direction, self.width), self.width, self.height)
 
     def uniformity2(self) -> float:
         min_x = min([x for x, y in self.positions])
@@ -116,33 +391,23 @@ class Piece:
 def merge_same_color_pieces(pieces: set[Piece]):
     # create a new set of pieces by merging pieces of the same color that are touching
 
-    # visit each piece and merge it with any pieces that are connected to it
-    visited = set([])
-    pos_piece_map = build_pos_piece_map(pieces)
-    pieces.clear()
-
-    for piece in pos_piece_map.values():
-        if piece in visited:
-            continue
+    if len(pieces) == 0:
+        return frozenset()
 
-        # find all pieces that are connected to this piece
-        connected_pieces = set([piece])
-        to_visit = piece.get_neighbour_positions()
-        while len(to_visit) > 0:
-            x, y = to_visit.pop()
-            connected_piece = pos_piece_map.get((x, y))
-            if connected_piece is not None and connected_piece not in connected_pieces and connected_piece.color == piece.color:
-                connected_pieces.add(connected_piece)
-                to_visit |= connected_piece.get_neighbour_positions()
+    # a color layer is the union of all the pieces of that color,
+    # its connected components are the merged pieces
+    any_piece = next(iter(pieces))
+    width, height = any_piece.width, any_piece.height
+    layers = {}
+    for piece in pieces:
+        layers[piece.color] = layers.get(piece.color, 0) | piece.mask
 
-        # merge all connected pieces into one piece
-        new_positions = set([])
-        for connected_piece in connected_pieces:
-            new_positions |= connected_piece.positions
-            visited.add(connected_piece)
-        pieces.add(Piece(piece.color, new_positions))
+    result = set([])
+    for color, layer in layers.items():
+        for component in split_components(layer, width, height):
+            result.add(Piece(color, component, width, height))
 
-    return frozenset(pieces)
+    return frozenset(result)
 
 
 def any_overlaps(pieces: set[Piece]):
@@ -188,51 +453,135 @@ class BoardState:
         height = len(lines)
         pieces = set([])
         for y, line in enumerate(lines):
+            if len(line) > width:
+                raise Exception("Line {} is wider than the board".format(y))
             for x, char in enumerate(line):
                 if char != '.' and char != ' ':
                     color = Color.parse_color(char)
-                    piece = Piece(color, set([(x, y)]))
+                    piece = Piece.from_positions(
+                        color, set([(x, y)]), width, height)
                     pieces.add(piece)
 
         return BoardState(width, height, merge_same_color_pieces(pieces))
 
     @staticmethod
-    def generate_random(width, height, div=2):
-        pieces = set([])
+    def generate_random(width, height, div=2, rng: random.Random = None):
+        # rng defaults to the global random module, a seeded random.Random makes the board reproducible
+        if rng is None:
+            rng = random
+
+        layers = {}
+        occupied = 0
 
         # lets fill about 1/2 of the board with pieces
         for _ in range(int(width * height / div)):
-            x = random.randint(0, width - 1)
-            y = random.randint(0, height - 1)
+            x = rng.randint(0, width - 1)
+            y = rng.randint(0, height - 1)
 
             # if there is already a piece at this position, skip it
-            if get_piece(x, y, pieces) is not None:
+            bit = position_bit(x, y, width)
+            if occupied & bit:
                 continue
 
-            color = random.choice(list(Color))
-            piece = Piece(color, set([(x, y)]))
-            pieces.add(piece)
+            color = rng.choice(list(Color))
+            layers[color] = layers.get(color, 0) | bit
+            occupied |= bit
 
-        return BoardState(width, height, merge_same_color_pieces(pieces))
+        pieces = set([])
+        for color, layer in layers.items():
+            for component in split_components(layer, width, height):
+                pieces.add(Piece(color, component, width, height))
+        return BoardState(width, height, frozenset(pieces))
+
+    # the format from_string reads, one row per line with . for empty cells
+    def to_string(self) -> str:
+        rows = [["."] * self.width for _ in range(self.height)]
+        for piece in self.pieces:
+            for x, y in piece.positions:
+                rows[y][x] = piece.color.name[0]
+        return "".join("".join(row) + "\n" for row in rows)
+
+    @staticmethod
+    def from_layers(width: int, height: int, layers) -> 'BoardState':
+        # the pieces are the connected components of each color's layer
+        pieces = set([])
+        for color, layer in zip(Color, layers):
+            for component in split_components(layer, width, height):
+                pieces.add(Piece(color, component, width, height))
+        return BoardState(width, height, frozenset(pieces), check_valid=False)
 
-    def __init__(self, width: int, height: int, pieces: frozenset[Piece], check_valid=True):
+    # the binary format above, the one compact form of a board: equal boards have equal bytes so they can be
+    # used as keys, sent to other processes or stored on disk
+    def to_bytes(self) -> bytes:
+        return layers_to_bytes(self.width, self.height, self.key)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'BoardState':
+        return BoardState.from_layers(*bytes_to_layers(data))
+
+    def __init__(self, width: int, height: int, pieces: frozenset[Piece], check_valid=True, zobrist: Optional[int] = None):
         self.width = width
         self.height = height
         self.pieces = pieces
 
-        # this should speed up get_piece
-        self.pos_piece_map = build_pos_piece_map(self.pieces)
+        # one bitmask per color, the pieces are the connected components of these layers
+        # so they fully describe the board
+        self.layers = {}
+        for piece in pieces:
+            self.layers[piece.color] = self.layers.get(
+                piece.color, 0) | piece.mask
+        self.occupied = 0
+        for layer in self.layers.values():
+            self.occupied |= layer
+
+        # layer masks in a fixed color order, used for equality
+        self.key = tuple([self.layers.get(color, 0) for color in Color])
+
+        # move_piece passes the hash it updated from the parent's, only new boards hash every cell
+        if zobrist is None:
+            zobrist = 0
+            for color, layer in self.layers.items():
+                zobrist ^= zobrist_hash(layer, color, width, height)
+        self.zobrist = zobrist
+
+        # built on first use, most boards in a search never need it
+        self._pos_piece_map = None
+        # (parent map, removed pieces, added piece) set by move_piece so the map can be patched instead of rebuilt
+        self._pos_piece_map_patch = None
+        # the piece the move that made this board ended up in (after merging), set by move_piece
+        self.moved_piece = None
+        # (piece, direction) of the move that made this board from its parent, set by move_piece
+        self.move = None
+        # set on the children children_predicate kept, they don't need to be checked for deadlocks in full
+        self.deadlock_checked = False
 
         if check_valid and not self.is_valid():
             raise Exception("Invalid board state")
 
-        self.num_colors = len(self.get_colors())
+        self.num_colors = len(self.layers)
+
+    @property
+    def pos_piece_map(self) -> dict[(int, int), Piece]:
+        # this should speed up get_piece
+        if self._pos_piece_map is None:
+            if self._pos_piece_map_patch is None:
+                self._pos_piece_map = build_pos_piece_map(self.pieces)
+            else:
+                parent_map, removed, added = self._pos_piece_map_patch
+                self._pos_piece_map = dict(parent_map)
+                for piece in removed:
+                    for pos in piece.positions:
+                        del self._pos_piece_map[pos]
+                for pos in added.positions:
+                    self._pos_piece_map[pos] = added
+                self._pos_piece_map_patch = None
+        return self._pos_piece_map
 
     def get_piece(self, x, y) -> Optional[Piece]:
         return self.pos_piece_map.get((x, y), None)
 
     def get_colors(self):
-        return set([piece.color for piece in self.pieces])
+        return set(self.layers.keys())
 
     def get_num_colors(self):
         return self.num_colors
@@ -250,24 +599,57 @@ class BoardState:
     #     return {color: self.get_num_pieces_of_color(color) for color in self.get_colors()}
 
     def num_piece_cells(self) -> int:
-        return sum([len(piece.positions) for piece in self.pieces])
+        return self.occupied.bit_count()
 
     def is_win(self) -> bool:
         return self.get_num_pieces() == self.get_num_colors()
 
     def is_piece_in_bounds(self, piece: Piece) -> bool:
-        return all([self.is_pos_in_bounds(x, y) for x, y in piece.positions])
+        return piece.mask & ~full_mask(self.width, self.height) == 0
+
+    def can_move_piece(self, piece: Piece, direction: Direction) -> bool:
+        if not piece.can_move(direction):
+            return False
+
+        # only the leading edge of the moved piece can hit another piece
+        leading_edge = shift_mask(piece.mask, direction, self.width) & ~piece.mask
+        return leading_edge & self.occupied == 0
 
     def move_piece(self, piece: Piece, direction: Direction) -> Optional['BoardState']:
-        new_piece = piece.move(direction)
-        if not self.is_piece_in_bounds(new_piece):
+        if not self.can_move_piece(piece, direction):
             return None
+        new_piece = piece.move(direction)
 
-        new_pieces = set(self.pieces) - set([piece]) | set([new_piece])
-        if any_overlaps(new_pieces):
-            return None
+        # merging doesn't change the color of any cell, only the cells the piece left and entered change the hash
+        zobrist = self.zobrist ^ zobrist_hash(piece.mask ^ new_piece.mask, piece.color, self.width, self.height)
+
+        # only the moved piece can touch a new piece of its color, every other piece stays as it is
+        removed = [piece]
+        merged_mask = new_piece.mask
+        touching = self.layers[piece.color] & ~piece.mask & new_piece.get_neighbour_mask()
+        for x, y in mask_to_positions(touching, self.width):
+            other = self.pos_piece_map[(x, y)]
+            if other not in removed:
+                removed.append(other)
+                merged_mask |= other.mask
+
+        if len(removed) > 1:
+            new_piece = Piece(piece.color, merged_mask, self.width, self.height)
+
+        result = BoardState(self.width, self.height,
+                            self.pieces.difference(removed) | set([new_piece]), check_valid=False, zobrist=zobrist)
+        result._pos_piece_map_patch = (self.pos_piece_map, removed, new_piece)
+        result.moved_piece = new_piece
+        result.move = (piece, direction)
+        return result
 
-        return BoardState(self.width, self.height, merge_same_color_pieces(new_pieces), check_valid=False)
+    # the move that turns this board into other, if there is one
+    def find_move(self, other: 'BoardState') -> Optional[tuple[Piece, Direction]]:
+        for piece in self.pieces:
+            for direction in Direction:
+                if self.can_move_piece(piece, direction) and self.move_piece(piece, direction) == other:
+                    return piece, direction
+        return None
 
     def piece_all_moves(self, piece: Piece) -> list['BoardState']:
         result = []
@@ -277,12 +659,59 @@ class BoardState:
                 result.append(new_state)
         return result
 
-    def children_predicate(self, predicate: Callable[['BoardState', Piece], bool] = lambda _: True):
-        result = []
-        for piece in self.pieces:
-            if predicate(self, piece):
-                result.extend(self.piece_all_moves(piece))
-        return result
+    def children_predicate(self, predicate: Callable[['BoardState', Piece], bool] = lambda board, piece: True, prune_deadlocks=True):
+        # boards that can't be solved anymore are left out, none of their descendants can be solved either.
+        # once a board was checked in full its children only need the check for the piece that moved
+        # the children come in a fixed order, pieces by their cells and moves that merge first, then moves
+        # toward the rest of the piece's color (it has cells past the piece in that direction), then the others
+        merging, toward, others = [], [], []
+        if prune_deadlocks and not self.deadlock_checked and self.is_deadlocked():
+            return merging
+        planes = half_planes(self.width, self.height)
+        for piece in sorted(self.pieces, key=lambda piece: piece.mask):
+            if not predicate(self, piece):
+                continue
+            rest = self.layers[piece.color] & ~piece.mask
+            if rest:
+                min_x, min_y, max_x, max_y = piece.bounds
+                past = {Direction.UP: planes[Direction.UP][min_y], Direction.DOWN: planes[Direction.DOWN][max_y],
+                        Direction.LEFT: planes[Direction.LEFT][min_x], Direction.RIGHT: planes[Direction.RIGHT][max_x]}
+            for direction in Direction:
+                child = self.move_piece(piece, direction)
+                if child is None:
+                    continue
+                if prune_deadlocks:
+                    if child.is_deadlocked(only_moved=True):
+                        continue
+                    child.deadlock_checked = True
+                if len(child.pieces) < len(self.pieces):
+                    merging.append(child)
+                elif rest and rest & past[direction]:
+                    toward.append(child)
+                else:
+                    others.append(child)
+        return merging + toward + others
+
+    def is_deadlocked(self, only_moved=False) -> bool:
+        # true when the board can't be solved anymore, false doesn't mean it can be solved.
+        # only_moved checks just the piece the last move made, when the parent wasn't deadlocked the other
+        # pieces separate the same regions they did there and no piece can get out of those
+        pieces = [self.moved_piece] if only_moved and self.moved_piece is not None else self.pieces
+        for piece in pieces:
+            if not spans_board(piece.mask, self.width, self.height):
+                continue
+
+            for regions in separated_regions(piece.mask, self.width, self.height):
+                for color, layer in self.layers.items():
+                    if color == piece.color:
+                        continue
+                    found = False
+                    for region in regions:
+                        if layer & region:
+                            if found:
+                                return True
+                            found = True
+        return False
 
     def should_move(self, piece: Piece):
         return self.get_num_pieces_of_color(piece.color) > 1 or self.is_piece_touching_another(piece)
@@ -291,39 +720,33 @@ class BoardState:
         return len([piece for piece in self.pieces if len(self.piece_all_moves(piece)) == 0])
 
     def is_piece_touching_another(self, piece: Piece) -> bool:
-        for x, y in piece.positions:
-            for direction in Direction:
-                other = self.get_piece(*shift_pos((x, y), direction))
-                if other is not None and other != piece:
-                    return True
-        return False
+        return piece.get_neighbour_mask() & self.occupied != 0
 
     def is_pos_in_bounds(self, x, y):
         return x >= 0 and x < self.width and y >= 0 and y < self.height
 
     def is_valid(self):
         for piece in self.pieces:
-            for x, y in piece.positions:
-                if not self.is_pos_in_bounds(x, y):
-                    print("Invalid position: ({}, {})".format(x, y))
-                    return False
+            if piece.width != self.width or piece.height != self.height:
+                print("Piece does not match the board size")
+                return False
+            if not self.is_piece_in_bounds(piece):
+                print("Invalid positions: {}".format(
+                    mask_to_positions(piece.mask & ~full_mask(self.width, self.height), self.width)))
+                return False
 
         # check for overlapping pieces
-        for y in range(self.height):
-            for x in range(self.width):
-                if len([piece for piece in self.pieces if (x, y) in piece.positions]) > 1:
-                    print("Overlapping pieces at ({}, {})".format(x, y))
-                    return False
+        if sum([piece.mask.bit_count() for piece in self.pieces]) != self.num_piece_cells():
+            print("Overlapping pieces")
+            return False
 
         # check for pieces that should be connected but aren't
         for piece in self.pieces:
-            for x, y in piece.positions:
-                for direction in Direction:
-                    pos = shift_pos((x, y), direction)
-                    other_piece = self.get_piece(*pos)
-                    if pos not in piece.positions and other_piece is not None and other_piece.color == piece.color:
-                        print("Pieces not connected at ({}, {})".format(x, y))
-                        return False
+            others = self.layers[piece.color] & piece.get_neighbour_mask()
+            if others != 0:
+                x, y = mask_to_positions(others, self.width)[0]
+                print("Pieces not connected at ({}, {})".format(x, y))
+                return False
 
         return True
 
@@ -351,11 +774,17 @@ class BoardState:
         result += "Win: " + str(self.is_win()) + "\n"
         return result
 
+    # exact, boards with colliding hashes still compare by their layers
     def __eq__(self, other):
-        return self.pieces == other.pieces
+        return self.zobrist == other.zobrist and self.key == other.key
 
     def __hash__(self):
-        return hash(self.pieces)
+        return self.zobrist
+
+    @cached_property
+    def canonical_key(self) -> tuple[int, ...]:
+        # equal for boards that only differ by a symmetry, for duplicate detection with symmetry=True in the searches
+        return canonical_layers(self.layers.values(), self.width, self.height)
 
 # tests
 
@@ -374,3 +803,195 @@ def test_equal():
     """)
 
     assert board2 == board2_copy
+
+
+def test_move_stays_on_board():
+    board = BoardState.from_string("""
+        ...R
+        R...
+    """)
+
+    # the right edge must not wrap around into the next row
+    top_right = board.get_piece(3, 0)
+    assert board.move_piece(top_right, Direction.RIGHT) is None
+    assert board.move_piece(top_right, Direction.UP) is None
+
+    moved = board.move_piece(top_right, Direction.DOWN)
+    assert moved.get_piece(3, 1).color == Color.RED
+    assert moved.get_num_pieces() == 2
+    assert moved.num_piece_cells() == 2
+
+
+def test_incremental_hash():
+    board = BoardState.from_string("""
+        R..G
+        .BR.
+        G..B
+    """)
+
+    for child in board.children_predicate(lambda b, p: True):
+        rebuilt = BoardState(child.width, child.height, child.pieces)
+        assert child.zobrist == rebuilt.zobrist
+        assert child == rebuilt
+
+
+def test_deadlocks():
+    # the example from the readme, the blue row keeps the reds apart
+    board = BoardState.from_string("""
+        RGGG
+        R...
+        BBBB
+        ...R
+    """)
+    assert board.is_deadlocked() and board.children_predicate() == []
+
+    # a full column works the same, greens on one side only are fine
+    assert BoardState.from_string("""
+        R.B.
+        ..B.
+        ..BR
+    """).is_deadlocked()
+    assert not BoardState.from_string("""
+        G.B.
+        ..B.
+        G.BR
+    """).is_deadlocked()
+
+    # the yellow piece doesn't fill a row but nothing gets past it either,
+    # the red piece in its pocket can't get out
+    assert BoardState.from_string("""
+        YY..R
+        .YYY.
+        .YRY.
+        G.YYY
+    """).is_deadlocked()
+    assert not BoardState.from_string("""
+        YY..R
+        .YYY.
+        .Y.Y.
+        G.YYY
+    """).is_deadlocked()
+
+
+def test_deadlocked_boards_are_unsolvable():
+    from collections import deque
+
+    for seed in range(12):
+        board = BoardState.generate_random(3, 3, 1.4, random.Random(seed))
+
+        # every reachable board and whether it can still be solved
+        parents = {board: []}
+        queue = deque([board])
+        while queue:
+            current = queue.popleft()
+            for child in current.children_predicate(prune_deadlocks=False):
+                if child not in parents:
+                    parents[child] = []
+                    queue.append(child)
+                parents[child].append(current)
+
+        solvable = set([b for b in parents if b.is_win()])
+        queue = deque(solvable)
+        while queue:
+            for parent in parents[queue.popleft()]:
+                if parent not in solvable:
+                    solvable.add(parent)
+                    queue.append(parent)
+
+        for current in parents:
+            assert not (current.is_deadlocked() and current in solvable)
+            # checking only the moved piece finds the same deadlocks
+            if not current.is_deadlocked():
+                assert current.children_predicate() == [child for child in current.children_predicate(
+                    prune_deadlocks=False) if not child.is_deadlocked()]
+
+
+def test_canonical_key():
+    board = BoardState.from_string("""
+        RR.G
+        .B..
+        G..B
+        ..Y.
+    """)
+    same = [
+        """
+        G.RR
+        ..B.
+        B..G
+        .Y..
+        """,  # mirrored
+        """
+        YY.B
+        .G..
+        B..G
+        ..R.
+        """,  # recolored
+        """
+        R.G.
+        RB..
+        ...Y
+        G.B.
+        """,  # transposed
+    ]
+    for string in same:
+        assert BoardState.from_string(string).canonical_key == board.canonical_key
+    assert all(child.canonical_key != board.canonical_key for child in board.children_predicate())
+
+    # only the mirror images keep the shape of a board that isn't square
+    wide = BoardState.from_string("RR..\nB..R\n")
+    assert BoardState.from_string("..RR\nR..B\n").canonical_key == wide.canonical_key
+    assert len(wide.canonical_key) == 2
+
+
+def test_children_order():
+    board = BoardState.from_string("""
+        R..R
+        .BB.
+        R...
+        ...G
+    """)
+    children = board.children_predicate()
+    # the two moves that merge a red piece come first, then the moves of red pieces toward other reds
+    assert [child.get_num_pieces() for child in children[:2]] == [4, 4]
+    assert children[2].get_num_pieces() == 5
+    assert children[2].moved_piece.color == Color.RED
+
+    # the same order no matter how the piece set was built
+    shuffled = BoardState(board.width, board.height, frozenset(reversed(list(board.pieces))))
+    assert [child.key for child in shuffled.children_predicate()] == [child.key for child in children]
+
+
+def test_bytes_roundtrip():
+    import pickle
+    import boards
+
+    rng = random.Random(3)
+    for board in list(boards.NAMED.values()) + [BoardState.generate_random(7, 5, rng=rng) for _ in range(20)]:
+        data = board.to_bytes()
+        assert BoardState.from_bytes(data) == board
+        assert pickle.loads(pickle.dumps(data)) == data
+        assert len(data) == 2 + (board.width * board.height + 7) // 8 + (board.num_piece_cells() * 2 + 7) // 8
+
+    # equal boards have equal bytes, however their pieces were put together
+    assert BoardState.from_string(boards.hard_3.to_string()).to_bytes() == boards.hard_3.to_bytes()
+    assert BoardState.from_string("...\n...\n").to_bytes() == bytes([3, 2, 0])
+
+    for data in [boards.hard_3.to_bytes()[:-1], boards.hard_3.to_bytes() + b"\0", bytes([2, 2, 0xFF]),
+                 b"", b"\x02", b"\x00\x00", b"\x00\x03", b"\x03\x00"]:
+        try:
+            BoardState.from_bytes(data)
+            assert False, data
+        except Exception as error:
+            assert str(error) == "Invalid board bytes"
+
+
+def test_split_components():
+    rng = random.Random(5)
+    for _ in range(200):
+        width, height = rng.randint(1, 8), rng.randint(1, 8)
+        mask = rng.getrandbits(width * height)
+        components = split_components(mask, width, height)
+        # every component is what a flood fill from its lowest cell reaches, lowest cells in order
+        assert components == [flood_fill(component & -component, mask, width, height) for component in components]
+        assert sorted(components, key=lambda component: component & -component) == components
+        assert sum(components) == mask
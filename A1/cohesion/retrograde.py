@@ -0,0 +1,237 @@
+import sys
+from array import array
+from typing import Optional
+from puzzle import BoardState, Direction, Piece
+import search
+
+# the whole state space of a small board: a level by level breadth first search numbers every board reachable
+# from the start one, then a second one backwards from the won boards gives each board its exact number of
+# moves left. 3x3 and sparse 4x4 boards have a few thousand boards, a full 4x4 like boards.medium_1 several
+# hundred thousand. the distances are the ground truth for heuristic_accuracy, and a lookup gives the best move
+# of any board in the space. boards children_predicate prunes as deadlocked are left out, they can't be won
+
+UNSOLVABLE = 255
+DIRECTIONS = list(Direction)
+
+
+class StateSpace:
+    # keys maps every board's to_bytes to its number, distances holds the moves left per number (UNSOLVABLE
+    # for boards that can't be won) and best the move to a board one move closer to a win, packed as
+    # cell * 4 + direction as in NodeArena (-1 for won and unsolvable boards)
+    def __init__(self, board: BoardState, max_states=1 << 20):
+        self.width = board.width
+        self.height = board.height
+        self.keys = {board.to_bytes(): 0}
+        self.distances = bytearray()
+        self.best = array("i")
+        self.explore(board, max_states)
+
+    def explore(self, board: BoardState, max_states: int):
+        # forward: the successors of every board, as one array with the offsets of each board's (compressed rows),
+        # and the move that leads to each successor
+        successors = array("I")
+        moves = array("i")
+        offsets = array("I", [0])
+        wins = []
+        frontier = [board]
+        while frontier:
+            next_frontier = []
+            for current in frontier:  # in number order, so the offsets line up
+                if current.is_win():
+                    wins.append(len(offsets) - 1)
+                else:
+                    for child in current.children_predicate():
+                        key = child.to_bytes()
+                        number = self.keys.get(key)
+                        if number is None:
+                            if len(self.keys) >= max_states:
+                                raise ValueError("More than {} reachable boards".format(max_states))
+                            number = self.keys[key] = len(self.keys)
+                            next_frontier.append(child)
+                        piece, direction = child.move
+                        successors.append(number)
+                        moves.append(((piece.mask & -piece.mask).bit_length() - 1) * 4 + DIRECTIONS.index(direction))
+                offsets.append(len(successors))
+            frontier = next_frontier
+
+        # backward: the predecessors of each board in the same layout, built by counting then filling
+        count = len(self.keys)
+        predecessor_offsets = array("I", bytes(4 * (count + 1)))
+        for number in successors:
+            predecessor_offsets[number + 1] += 1
+        for number in range(count):
+            predecessor_offsets[number + 1] += predecessor_offsets[number]
+        predecessors = array("I", bytes(4 * len(successors)))
+        filled = predecessor_offsets[:-1]
+        for parent in range(count):
+            for edge in range(offsets[parent], offsets[parent + 1]):
+                child = successors[edge]
+                predecessors[filled[child]] = parent
+                filled[child] += 1
+
+        self.distances = bytearray([UNSOLVABLE]) * count
+        self.best = array("i", [-1]) * count
+        for number in wins:
+            self.distances[number] = 0
+        frontier = wins
+        distance = 0
+        while frontier:
+            distance += 1
+            if distance >= UNSOLVABLE:
+                raise ValueError("Boards more than {} moves from a win".format(UNSOLVABLE - 1))
+            next_frontier = []
+            for child in frontier:
+                for parent in predecessors[predecessor_offsets[child]:predecessor_offsets[child + 1]]:
+                    if self.distances[parent] == UNSOLVABLE:
+                        self.distances[parent] = distance
+                        next_frontier.append(parent)
+            frontier = next_frontier
+
+        # the first move of each board to one a move closer, in children_predicate order
+        for parent in range(count):
+            distance = self.distances[parent]
+            if distance != 0 and distance != UNSOLVABLE:
+                for edge in range(offsets[parent], offsets[parent + 1]):
+                    if self.distances[successors[edge]] == distance - 1:
+                        self.best[parent] = moves[edge]
+                        break
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, board: BoardState) -> bool:
+        return board.to_bytes() in self.keys
+
+    def number(self, board: BoardState) -> int:
+        number = self.keys.get(board.to_bytes())
+        if number is None:
+            raise ValueError("Board is not reachable from the explored one")
+        return number
+
+    def distance(self, board: BoardState) -> Optional[int]:
+        # moves left with perfect play, None if the board can't be won
+        distance = self.distances[self.number(board)]
+        return None if distance == UNSOLVABLE else distance
+
+    def best_move(self, board: BoardState) -> Optional[tuple[Piece, Direction]]:
+        # a move to a board one move closer to a win, None for won and unsolvable boards
+        move = self.best[self.number(board)]
+        if move < 0:
+            return None
+        cell, direction = divmod(move, 4)
+        piece = next(piece for piece in board.pieces if piece.mask >> cell & 1)
+        return piece, DIRECTIONS[direction]
+
+    def solve(self, board: BoardState) -> Optional[search.TreeNode]:
+        # a shortest solution by following the best moves, as a node chain like the searches return
+        if self.distance(board) is None:
+            return None
+        node = search.TreeNode(board)
+        while not node.board.is_win():
+            node = search.TreeNode(node.board.move_piece(*self.best_move(node.board)), node)
+        return node
+
+    def heuristic(self, board: BoardState, depth: int) -> float:
+        # the exact distance in the searches' heuristic signature, a* with it only expands boards on a solution
+        distance = self.distances[self.number(board)]
+        return float("inf") if distance == UNSOLVABLE else distance
+
+    def boards(self):
+        # every board in the space with its distance (None when it can't be won)
+        for key, number in self.keys.items():
+            distance = self.distances[number]
+            yield BoardState.from_bytes(key), None if distance == UNSOLVABLE else distance
+
+    def memory(self) -> int:
+        return (sys.getsizeof(self.keys) + sum(sys.getsizeof(key) for key in self.keys)
+                + len(self.distances) + len(self.best) * self.best.itemsize)
+
+    def summary(self) -> dict:
+        solvable = [distance for distance in self.distances if distance != UNSOLVABLE]
+        return {
+            "boards": len(self),
+            "solvable": len(solvable),
+            "wins": solvable.count(0),
+            "max_distance": max(solvable, default=None),
+            "memory": self.memory(),
+        }
+
+
+def heuristic_accuracy(space: StateSpace, heuristic) -> dict:
+    # how a heuristic (in the searches' signature, depth is passed as 0) compares with the exact distances of
+    # every solvable board: the share it gets exactly right, the share it doesn't overestimate (all of them
+    # for an admissible heuristic), its mean signed and absolute error in moves and its worst overestimate
+    count = exact = admissible = 0
+    error = absolute_error = 0.0
+    worst = 0.0
+    for board, distance in space.boards():
+        if distance is None:
+            continue
+        difference = heuristic(board, 0) - distance
+        count += 1
+        exact += difference == 0
+        admissible += difference <= 0
+        error += difference
+        absolute_error += abs(difference)
+        worst = max(worst, difference)
+
+    return {
+        "boards": count,
+        "exact": exact / count if count else 0,
+        "admissible": admissible / count if count else 0,
+        "mean_error": error / count if count else 0,
+        "mean_absolute_error": absolute_error / count if count else 0,
+        "max_overestimate": worst,
+    }
+
+# tests
+
+
+def test_distances():
+    import boards
+
+    space = StateSpace(boards.easy_1)
+    assert len(space) == 3780 and boards.easy_1 in space
+
+    # a breadth first search finds solutions as short as the table says
+    assert search.bfs(boards.easy_1).depth() == space.distance(boards.easy_1)
+    for board, distance in list(space.boards())[::300]:
+        solution = search.bfs(board)
+        assert (solution.depth() if solution is not None else None) == distance
+
+    # following the best moves is a shortest solution, every board on it a move closer
+    space = StateSpace(boards.hard_1)
+    node = space.solve(boards.hard_1)
+    path = search.get_path(node)
+    assert node.board.is_win() and node.depth() == space.distance(boards.hard_1)
+    assert [space.distance(step.board) for step in path] == list(range(node.depth(), -1, -1))
+    assert space.best_move(node.board) is None
+    assert search.a_star(boards.hard_1, space.heuristic).depth() == node.depth()
+
+
+def test_state_limit():
+    import boards
+
+    try:
+        StateSpace(boards.medium_1, max_states=1000)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_heuristic_accuracy():
+    import boards
+    import heuristics
+
+    space = StateSpace(boards.hard_1)
+    exact = heuristic_accuracy(space, space.heuristic)
+    assert exact["exact"] == 1 and exact["max_overestimate"] == 0
+
+    admissible = heuristic_accuracy(space, search.multi_heuristic([(heuristics.mst_gap_heuristic, lambda _: 1)]))
+    assert admissible["admissible"] == 1 and admissible["mean_error"] <= 0
+    assert admissible["boards"] == space.summary()["solvable"]
+
+    # weighing the pieces a hundred times overestimates
+    inflated = heuristic_accuracy(space, search.multi_heuristic([(search.pieces_heuristic, lambda _: 100)]))
+    assert inflated["max_overestimate"] > 0 and inflated["admissible"] < 1
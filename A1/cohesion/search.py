@@ -1,19 +1,80 @@
 import heapq
-import graphics
-import pygame
-from puzzle import BoardState, Piece
+import signal
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict, deque
+from functools import lru_cache
+from puzzle import BoardState, Direction, Piece, mask_to_positions
+from duplicates import BoardSet, FingerprintTable, PackedSet, duplicate_key
 
 
 class TreeNode:
+    __slots__ = ("board", "parent", "_depth", "f")
+
     def __init__(self, board: BoardState, parent=None):
         self.board = board
         self.parent = parent
         self._depth = parent.depth() + 1 if parent is not None else 0
+        # priority in the open list, evaluated once when the node is pushed
+        self.f = 0
 
     def depth(self):
         return self._depth
 
 
+# tie breakers rank nodes with the same f, they get the node and its insertion number
+def fifo_tie_breaker(node: TreeNode, count: int):
+    return count
+
+
+def lifo_tie_breaker(node: TreeNode, count: int):
+    return -count
+
+
+def deeper_first_tie_breaker(node: TreeNode, count: int):
+    return -node.depth()
+
+
+class OpenList:
+    # priority queue of (f, tie breaker, insertion number, node) tuples
+    # the insertion number is unique so nodes themselves are never compared,
+    # every search creates its own so searches can run side by side
+    def __init__(self, tie_breaker=fifo_tie_breaker):
+        self.heap = []
+        self.tie_breaker = tie_breaker
+        self.count = 0
+        self.peak_size = 0
+
+    def push(self, node: TreeNode, f):
+        node.f = f
+        heapq.heappush(
+            self.heap, (f, self.tie_breaker(node, self.count), self.count, node))
+        self.count += 1
+        if len(self.heap) > self.peak_size:
+            self.peak_size = len(self.heap)
+
+    def pop(self) -> TreeNode:
+        return heapq.heappop(self.heap)[-1]
+
+    def peek(self, count: int) -> list[TreeNode]:
+        # the next count nodes pop would return, in that order, left in the list
+        entries = [heapq.heappop(self.heap) for _ in range(min(count, len(self.heap)))]
+        for entry in entries:
+            heapq.heappush(self.heap, entry)
+        return [entry[-1] for entry in entries]
+
+    def __len__(self):
+        return len(self.heap)
+
+    def peak_memory(self) -> int:
+        # approximate bytes taken by the heap array and its entries at its largest,
+        # the nodes are not counted since the search tree keeps them alive anyway
+        entry = sys.getsizeof((0, 0, 0, None)) + 8
+        return sys.getsizeof([]) + self.peak_size * entry
+
+
 def get_path(node: TreeNode) -> list[TreeNode]:
     # from root to node
     path = []
@@ -24,6 +85,27 @@ def get_path(node: TreeNode) -> list[TreeNode]:
     return path[::-1]
 
 
+def path_moves(path: list[TreeNode]) -> list[list]:
+    # every move as [x, y, direction] with the top left cell of the moved piece
+    moves = []
+    for parent, child in zip(path, path[1:]):
+        piece, direction = parent.board.find_move(child.board)
+        x, y = mask_to_positions(piece.mask, piece.width)[0]
+        moves.append([x, y, direction.name])
+    return moves
+
+
+def replay_moves(board: BoardState, moves: list[list]) -> TreeNode:
+    # the path_moves of a solution played again from the board, as a node chain
+    node = TreeNode(board)
+    for x, y, direction in moves:
+        child = node.board.move_piece(node.board.pos_piece_map[(x, y)], Direction[direction])
+        if child is None:
+            raise Exception("Invalid move {} {} {}".format(x, y, direction))
+        node = TreeNode(child, node)
+    return node
+
+
 def print_path(node: TreeNode):
     if node is None:
         return
@@ -34,40 +116,229 @@ def print_path(node: TreeNode):
     print(node.board)
 
 
-def bfs(board: BoardState):
-    queue = [TreeNode(board)]
+class SearchObserver:
+    # searches report what they do to an observer, every event does nothing by default.
+    # node_popped gets the sizes of the open and closed sets and returns True to cancel the search
+    def node_popped(self, node: TreeNode, open_size: int, closed_size: int) -> bool:
+        return False
+
+    def node_generated(self, node: TreeNode):
+        pass
+
+    def duplicate_pruned(self, board: BoardState):
+        pass
+
+    def solution_found(self, node: TreeNode):
+        pass
+
+    def wrap_heuristic(self, heuristic):
+        # lets an observer time or count the heuristic calls
+        return heuristic
+
+
+class ObserverList(SearchObserver):
+    def __init__(self, observers: list[SearchObserver]):
+        self.observers = observers
+
+    def node_popped(self, node: TreeNode, open_size: int, closed_size: int) -> bool:
+        cancel = False
+        for observer in self.observers:
+            cancel = observer.node_popped(node, open_size, closed_size) or cancel
+        return cancel
+
+    def node_generated(self, node: TreeNode):
+        for observer in self.observers:
+            observer.node_generated(node)
+
+    def duplicate_pruned(self, board: BoardState):
+        for observer in self.observers:
+            observer.duplicate_pruned(board)
+
+    def solution_found(self, node: TreeNode):
+        for observer in self.observers:
+            observer.solution_found(node)
+
+    def wrap_heuristic(self, heuristic):
+        for observer in self.observers:
+            heuristic = observer.wrap_heuristic(heuristic)
+        return heuristic
+
+
+class SearchCounters(SearchObserver):
+    # cheap counters: a few additions per event and two clock reads per heuristic call
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+        self.popped = 0
+        self.generated = 0
+        self.pruned = 0
+        self.open_size = 0
+        self.closed_size = 0
+        self.peak_open_size = 0
+        self.peak_closed_size = 0
+        self.heuristic_calls = 0
+        self.heuristic_time = 0
+
+    def node_popped(self, node: TreeNode, open_size: int, closed_size: int) -> bool:
+        self.popped += 1
+        self.open_size = open_size
+        self.closed_size = closed_size
+        if open_size > self.peak_open_size:
+            self.peak_open_size = open_size
+        if closed_size > self.peak_closed_size:
+            self.peak_closed_size = closed_size
+        return False
+
+    def node_generated(self, node: TreeNode):
+        self.generated += 1
+
+    def duplicate_pruned(self, board: BoardState):
+        self.pruned += 1
+
+    def solution_found(self, node: TreeNode):
+        self.end = time.perf_counter()
+
+    def wrap_heuristic(self, heuristic):
+        def timed(board: BoardState, depth: int):
+            start = time.perf_counter()
+            value = heuristic(board, depth)
+            self.heuristic_time += time.perf_counter() - start
+            self.heuristic_calls += 1
+            return value
+        return timed
+
+    def elapsed(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def nodes_per_second(self) -> float:
+        elapsed = self.elapsed()
+        return self.popped / elapsed if elapsed > 0 else 0
+
+    def branching_factor(self) -> float:
+        # children generated or pruned per popped node
+        return (self.generated + self.pruned) / self.popped if self.popped else 0
+
+    def heuristic_share(self) -> float:
+        # fraction of the search time spent in the heuristic
+        elapsed = self.elapsed()
+        return self.heuristic_time / elapsed if elapsed > 0 else 0
+
+    def summary(self) -> dict:
+        return {
+            "popped": self.popped,
+            "generated": self.generated,
+            "pruned": self.pruned,
+            "nodes_per_second": self.nodes_per_second(),
+            "branching_factor": self.branching_factor(),
+            "peak_open_size": self.peak_open_size,
+            "peak_closed_size": self.peak_closed_size,
+            "heuristic_share": self.heuristic_share(),
+            "time": self.elapsed(),
+        }
+
+
+def on_alarm(signum, frame):
+    raise TimeoutError()
+
+
+def run_with_timeout(function, timeout: float = None):
+    # function() stopped with a TimeoutError after timeout seconds (None for no limit), by a SIGALRM timer so
+    # only from the main thread. the alarm can also go off after function returned, before the timer is
+    # cleared, that is a TimeoutError too
+    if timeout is None:
+        return function()
+    signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return function()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def prepare_observer(observer: SearchObserver, screen, heuristic):
+    # a screen is shorthand for the throttled gui observer, it is only loaded (with pygame) when a screen is passed
+    if screen is not None:
+        import graphics
+        drawer = graphics.DrawObserver(screen, heuristic)
+        observer = drawer if observer is None else ObserverList(
+            [observer, drawer])
+
+    if observer is not None and heuristic is not None:
+        heuristic = observer.wrap_heuristic(heuristic)
+    return observer, heuristic
+
+
+def prepare_visited(visited, symmetry: bool, store=BoardSet):
+    # a new store, or the one that was passed if it treats symmetric boards the way the search was asked to
+    if visited is None:
+        return store(symmetry=symmetry)
+    if visited.symmetry != symmetry:
+        raise ValueError("Visited store has symmetry={} but the search symmetry={}".format(visited.symmetry, symmetry))
+    return visited
+
+
+def bfs(board: BoardState, screen=None, observer: SearchObserver = None, visited=None):
+    # boards are marked as visited when they are generated, so each one is queued once and the first
+    # solution popped is a shortest one
+    observer, _ = prepare_observer(observer, screen, None)
+    queue = deque([TreeNode(board)])
+    if visited is None:
+        visited = BoardSet()
+    visited.add(board)
 
     while queue:
-        current = queue.pop(0)
+        current = queue.popleft()
+
+        if observer is not None:
+            if observer.node_popped(current, len(queue), len(visited)):
+                return None
 
         if current.board.is_win():
+            if observer is not None:
+                observer.solution_found(current)
             return current
 
-        for neighbour in current.board.children():
-            queue.append(TreeNode(neighbour, current))
+        for neighbour in current.board.children_predicate():
+            if neighbour not in visited:
+                visited.add(neighbour)
+                queue.append(TreeNode(neighbour, current))
+                if observer is not None:
+                    observer.node_generated(queue[-1])
+            elif observer is not None:
+                observer.duplicate_pruned(neighbour)
 
     return None
 
 
-def dfs(board: BoardState, screen=None):
+def dfs(board: BoardState, screen=None, observer: SearchObserver = None, visited=None):
+    # visited is any store from duplicates, a BloomFilter keeps a long search in fixed memory
+    # (a board it wrongly reports as seen is skipped, so the search can miss solutions)
+    observer, _ = prepare_observer(observer, screen, None)
     stack = [TreeNode(board)]
-    visited = set()
+    if visited is None:
+        visited = BoardSet()
 
     while stack:
         current = stack.pop()
         visited.add(current.board)
 
-        if screen is not None:
-            if draw_search_debug(current, screen, visited):
+        if observer is not None:
+            if observer.node_popped(current, len(stack), len(visited)):
                 return None
 
         if current.board.is_win():
+            if observer is not None:
+                observer.solution_found(current)
             return current
 
-        for neighbour in current.board.children():
+        for neighbour in current.board.children_predicate():
             if neighbour not in visited:
                 visited.add(neighbour)
                 stack.append(TreeNode(neighbour, current))
+                if observer is not None:
+                    observer.node_generated(stack[-1])
+            elif observer is not None:
+                observer.duplicate_pruned(neighbour)
 
     return None
 
@@ -139,117 +410,730 @@ def piece_uniformity_heuristic(board: BoardState):
     return sum([piece.uniformity2() for piece in board.pieces])
 
 
-def multi_heuristic(heuristics: list[tuple[callable, callable]]):
+def multi_heuristic(heuristics: list[tuple[callable, callable]], cache_size=100000):
+    # the heuristics only depend on the board so their values are kept in an LRU cache,
+    # looked up by the board's zobrist hash (collisions still compare the boards exactly)
+    @lru_cache(maxsize=cache_size)
+    def values(board: BoardState):
+        return tuple([h(board) for h, _ in heuristics])
+
     def heuristic(board: BoardState, depth: int):
-        return sum([h(board) * w(depth) for h, w in heuristics])
+        return sum([value * w(depth) for value, (_, w) in zip(values(board), heuristics)])
+
+    # hit/miss counters
+    heuristic.cache_info = values.cache_info
+    heuristic.cache_clear = values.cache_clear
 
     return heuristic
 
 
-def greedy_search(board: BoardState, heuristic, screen=None):
-    setattr(TreeNode, "__lt__", lambda self, other:
-            heuristic(self.board, self.depth() - 1) < heuristic(other.board, self.depth() - 1))
-    heap = [TreeNode(board)]
-    visited = set()  # to not visit the same state twice
+# the searches take the store for the boards they have seen as `visited` (see duplicates.py), by default a set of
+# the boards. with symmetry the default set counts boards that only differ by a symmetry as the same
 
-    while heap:
-        node = heapq.heappop(heap)
+
+def greedy_search(board: BoardState, heuristic, screen=None, open_list: OpenList = None, stats: dict = None, observer: SearchObserver = None, symmetry=False, visited=None):
+    observer, heuristic = prepare_observer(observer, screen, heuristic)
+    if open_list is None:
+        open_list = OpenList()
+    open_list.push(TreeNode(board), heuristic(board, 0))
+    visited = prepare_visited(visited, symmetry)  # to not visit the same state twice
+
+    while open_list:
+        node = open_list.pop()
         visited.add(node.board)
 
-        if screen is not None:
-            if draw_search_debug(node, screen, visited, heuristic):
+        if observer is not None:
+            if observer.node_popped(node, len(open_list), len(visited)):
                 return None
 
         if node.board.is_win():
+            if observer is not None:
+                observer.solution_found(node)
             return node
 
-        for child in node.board.children_without_already_completed():
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + 1
+
+        for child in node.board.children_predicate(lambda b, p: b.should_move(p)):
             if child not in visited:
-                heapq.heappush(heap, TreeNode(child, node))
+                child_node = TreeNode(child, node)
+                open_list.push(child_node, heuristic(child, node.depth() + 1))
+                if observer is not None:
+                    observer.node_generated(child_node)
+            elif observer is not None:
+                observer.duplicate_pruned(child)
 
     return None
 
 
-def a_star(board: BoardState, heuristic, depth_limit=None, weight=1, screen=None):
-    setattr(TreeNode, "__lt__", lambda self, other: self.depth() +
-            heuristic(self.board, self.depth()) * weight < other.depth() + heuristic(other.board, self.depth()) * weight)
+def a_star(board: BoardState, heuristic, depth_limit=None, weight=1, screen=None, open_list: OpenList = None, reopen=False, stats: dict = None, observer: SearchObserver = None, symmetry=False, visited=None):
+    if reopen:
+        # reopening needs the cost each board was reached with, which a visited store doesn't keep
+        if visited is not None:
+            raise ValueError("a_star with reopen keeps its own costs, it can't use a visited store")
+        return a_star_closed(board, heuristic, depth_limit, weight, screen, open_list, stats, observer, symmetry)
 
-    heap = [TreeNode(board)]
-    visited = set([board])  # to not visit the same state twice
+    observer, heuristic = prepare_observer(observer, screen, heuristic)
 
-    while heap:
-        node = heapq.heappop(heap)
+    if open_list is None:
+        open_list = OpenList()
+    open_list.push(TreeNode(board), heuristic(board, 0) * weight)
+    visited = prepare_visited(visited, symmetry)  # to not visit the same state twice
+    visited.add(board)
+
+    while open_list:
+        node = open_list.pop()
         # visited.add(node.board)
 
-        if screen is not None:
-            if draw_search_debug(node, screen, visited, heuristic):
+        if observer is not None:
+            if observer.node_popped(node, len(open_list), len(visited)):
                 return None
 
         if node.board.is_win():
+            if observer is not None:
+                observer.solution_found(node)
             return node
 
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + 1
+
         for child in node.board.children_predicate(lambda b, p: b.should_move(p)):
             if child not in visited and (depth_limit is None or node.depth() + 1 < depth_limit):
                 visited.add(child)
-                heapq.heappush(heap, TreeNode(child, parent=node))
+                depth = node.depth() + 1
+                child_node = TreeNode(child, parent=node)
+                open_list.push(child_node, depth +
+                               heuristic(child, depth) * weight)
+                if observer is not None:
+                    observer.node_generated(child_node)
+            elif observer is not None and child in visited:
+                observer.duplicate_pruned(child)
 
     return None
 
 
-def beam_search(board: BoardState, heuristic, beam_width=3, depth_limit=None, weight=1, screen=None):
-    setattr(TreeNode, "__lt__", lambda self, other: self.depth() +
-            heuristic(self.board, self.depth()) * weight < other.depth() + heuristic(other.board, self.depth()) * weight)
+def a_star_closed(board: BoardState, heuristic, depth_limit=None, weight=1, screen=None, open_list: OpenList = None, stats: dict = None, observer: SearchObserver = None, symmetry=False):
+    # a* with a closed set that reopens a board when it is reached again with a lower cost,
+    # every piece is allowed to move and the goal is tested when a node is popped, so with an
+    # admissible heuristic (and weight 1) the solution found is a shortest one
+    observer, heuristic = prepare_observer(observer, screen, heuristic)
+    key = duplicate_key(symmetry)
+    if open_list is None:
+        open_list = OpenList()
+    open_list.push(TreeNode(board), heuristic(board, 0) * weight)
+    # lowest cost each board was reached with, a board is reopened (pushed again, whether it was expanded or
+    # not) when a cheaper path to it is found, so an expanded board never needs a separate closed set
+    best_depth = {key(board): 0}
+
+    while open_list:
+        node = open_list.pop()
+
+        # skip entries that were superseded by a cheaper path to the same board
+        if node.depth() > best_depth[key(node.board)]:
+            continue
+
+        if observer is not None:
+            if observer.node_popped(node, len(open_list), len(best_depth)):
+                return None
+
+        if node.board.is_win():
+            if observer is not None:
+                observer.solution_found(node)
+            return node
+
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + 1
+
+        depth = node.depth() + 1
+        if depth_limit is not None and depth >= depth_limit:
+            continue
+
+        for child in node.board.children_predicate():
+            child_key = key(child)
+            if depth < best_depth.get(child_key, depth + 1):
+                best_depth[child_key] = depth
+                child_node = TreeNode(child, parent=node)
+                open_list.push(child_node, depth +
+                               heuristic(child, depth) * weight)
+                if observer is not None:
+                    observer.node_generated(child_node)
+            elif observer is not None:
+                observer.duplicate_pruned(child)
+
+    return None
 
-    heap = [TreeNode(board)]
-    visited = set()  # to not visit the same state twice
+
+DIRECTIONS = list(Direction)
+
+
+def float_order(f: float) -> int:
+    # the bits of a double as an unsigned int that sorts the same way the floats do (negatives flipped)
+    bits = struct.unpack("<Q", struct.pack("<d", f))[0]
+    return bits ^ 0xFFFFFFFFFFFFFFFF if bits >> 63 else bits | 1 << 63
+
+
+class NodeArena:
+    # the search tree as parallel arrays indexed by node number: the parent's number, the depth (g), f and the move
+    # that made the node's board from its parent's, packed as cell * 4 + direction with the lowest cell of the
+    # moved piece, 20 bytes a node. boards only live in an LRU cache of recent nodes' boards, any other one is
+    # rebuilt by replaying the moves from its closest cached ancestor
+    def __init__(self, board: BoardState, cache_size=1 << 10):
+        self.parents = array("i", [-1])
+        self.depths = array("i", [0])
+        self.fs = array("d", [0])
+        self.moves = array("i", [-1])
+        self.root = board
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def add(self, parent: int, board: BoardState, f: float) -> int:
+        # board is the child of the parent's board move_piece made, returns the new node's number
+        piece, direction = board.move
+        cell = (piece.mask & -piece.mask).bit_length() - 1
+        self.parents.append(parent)
+        self.depths.append(self.depths[parent] + 1)
+        self.fs.append(f)
+        self.moves.append(cell * 4 + DIRECTIONS.index(direction))
+        return len(self.parents) - 1
+
+    def put(self, index: int, board: BoardState):
+        self.cache[index] = board
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def board(self, index: int) -> BoardState:
+        if index == 0:
+            return self.root
+        board = self.cache.get(index)
+        if board is not None:
+            self.cache.move_to_end(index)
+            return board
+
+        missing = []
+        while index != 0 and index not in self.cache:
+            missing.append(index)
+            index = self.parents[index]
+        board = self.cache[index] if index != 0 else self.root
+        for index in reversed(missing):
+            cell, direction = divmod(self.moves[index], 4)
+            piece = next(piece for piece in board.pieces if piece.mask >> cell & 1)
+            board = board.move_piece(piece, DIRECTIONS[direction])
+            self.put(index, board)
+        return board
+
+    def node(self, index: int) -> TreeNode:
+        # a TreeNode without a parent (so it doesn't keep the boards above it alive), for the observers
+        node = TreeNode(self.board(index))
+        node._depth = self.depths[index]
+        node.f = self.fs[index]
+        return node
+
+    def path(self, index: int) -> TreeNode:
+        # the TreeNode chain from the root, so get_path works on it as on any other search's nodes
+        indices = []
+        while index != 0:
+            indices.append(index)
+            index = self.parents[index]
+        node = TreeNode(self.root)
+        node.f = self.fs[0]
+        for index in reversed(indices):
+            node = TreeNode(self.board(index), node)
+            node.f = self.fs[index]
+        return node
+
+    def __len__(self):
+        return len(self.parents)
+
+    def memory(self) -> int:
+        # bytes taken by the arrays, the cached boards are not counted
+        return sum(len(values) * values.itemsize for values in [self.parents, self.depths, self.fs, self.moves])
+
+
+def a_star_arena(board: BoardState, heuristic, depth_limit=None, weight=1, cache_size=1 << 10, stats: dict = None, observer: SearchObserver = None, symmetry=False, visited=None):
+    # a_star with its nodes in a NodeArena, it expands the same nodes in the same order and returns the same solution.
+    # each open list entry is one int, float_order(f) above the 32 bit node number, and the visited store holds
+    # packed boards by default, so no board is kept alive by the search except the ones in the arena's cache
+    # (and the heuristic's, multi_heuristic's cache_size bounds that one). measured with tracemalloc on
+    # boards.hard_2 that is about 160 bytes per generated node with the default PackedSet, most of it the packed
+    # boards, and about 80 with a 64 bit FingerprintTable as the visited store: 20 for the arena's arrays, about
+    # 45 for the heap entry and the rest for the fingerprint
+    observer, heuristic = prepare_observer(observer, None, heuristic)
+    visited = prepare_visited(visited, symmetry, PackedSet)
+    arena = NodeArena(board, cache_size)
+    f = heuristic(board, 0) * weight
+    arena.fs[0] = f
+    heap = [float_order(f) << 32]  # the node numbers are in push order, so ties are broken first in first out
+    visited.add(board)
+
+    def finish(result):
+        if stats is not None:
+            stats["arena_nodes"] = len(arena)
+            stats["arena_memory"] = arena.memory()
+        return result
 
     while heap:
-        node = heapq.heappop(heap)
-        visited.add(node.board)
+        index = heapq.heappop(heap) & 0xFFFFFFFF
+        current = arena.board(index)
 
-        if screen is not None:
-            if draw_search_debug(node, screen, visited, heuristic):
-                return None
+        if observer is not None:
+            if observer.node_popped(arena.node(index), len(heap), len(visited)):
+                return finish(None)
 
-        if node.board.is_win():
-            return node
+        if current.is_win():
+            node = arena.path(index)
+            if observer is not None:
+                observer.solution_found(node)
+            return finish(node)
 
-        for child in node.board.children_predicate(lambda b, p: b.should_move(p)):
-            if child not in visited and (depth_limit is None or node.depth() + 1 < depth_limit):
-                visited.add(child)
-                heapq.heappush(heap, TreeNode(child, parent=node))
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + 1
 
-        if len(heap) > beam_width:
-            heap = heap[:beam_width]
+        depth = arena.depths[index] + 1
+        for child in current.children_predicate(lambda b, p: b.should_move(p)):
+            if child not in visited and (depth_limit is None or depth < depth_limit):
+                visited.add(child)
+                f = depth + heuristic(child, depth) * weight
+                child_index = arena.add(index, child, f)
+                arena.put(child_index, child)
+                heapq.heappush(heap, float_order(f) << 32 | child_index)
+                if observer is not None:
+                    observer.node_generated(arena.node(child_index))
+            elif observer is not None and child in visited:
+                observer.duplicate_pruned(child)
+
+    return finish(None)
+
+
+class TranspositionTable:
+    # fixed number of slots indexed by the board hash, a new entry replaces whatever was in its slot
+    def __init__(self, size=1 << 16):
+        self.size = size
+        self.slots = [None] * size
+
+    def get(self, board: BoardState, iteration: int):
+        entry = self.slots[hash(board) % self.size]
+        if entry is not None and entry[2] == iteration and entry[0] == board:
+            return entry[1]
+        return None
+
+    def put(self, board: BoardState, depth: int, iteration: int):
+        self.slots[hash(board) % self.size] = (board, depth, iteration)
+
+
+def ida_star(board: BoardState, heuristic, depth_limit=None, weight=1, table_size=1 << 16, screen=None, stats: dict = None, observer: SearchObserver = None):
+    # iterative deepening a*: depth first searches bounded by f, raising the bound to the smallest f that
+    # went over it, memory only grows with the depth of the path (and the optional transposition table)
+    observer, heuristic = prepare_observer(observer, screen, heuristic)
+    table = TranspositionTable(table_size) if table_size else None
+    path = set([board])  # boards on the current path, to not walk in circles
+    iteration = 0
+
+    # returns (solution node or None, smallest f over the bound or None if cancelled)
+    def search(node: TreeNode, bound):
+        f = node.depth() + heuristic(node.board, node.depth()) * weight
+        if f > bound:
+            return None, f
+
+        # the open set of a depth first search is the current path
+        if observer is not None:
+            if observer.node_popped(node, len(path), 0):
+                return None, None
 
+        if node.board.is_win():
+            if observer is not None:
+                observer.solution_found(node)
+            return node, f
+
+        if depth_limit is not None and node.depth() + 1 >= depth_limit:
+            return None, float("inf")
+
+        # the same board was already searched from at most this depth in this iteration
+        if table is not None:
+            depth = table.get(node.board, iteration)
+            if depth is not None and depth <= node.depth():
+                if observer is not None:
+                    observer.duplicate_pruned(node.board)
+                return None, float("inf")
+            table.put(node.board, node.depth(), iteration)
+
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + 1
+
+        minimum = float("inf")
+        for child in node.board.children_predicate():
+            if child in path:
+                if observer is not None:
+                    observer.duplicate_pruned(child)
+                continue
+
+            child_node = TreeNode(child, parent=node)
+            if observer is not None:
+                observer.node_generated(child_node)
+
+            path.add(child)
+            found, t = search(child_node, bound)
+            path.remove(child)
+
+            if found is not None or t is None:
+                return found, t
+            minimum = min(minimum, t)
+
+        return None, minimum
+
+    root = TreeNode(board)
+    bound = heuristic(board, 0) * weight
+    while True:
+        found, bound = search(root, bound)
+        if found is not None:
+            return found
+        if bound is None or bound == float("inf"):
+            return None
+        iteration += 1
+
+
+def beam_search(board: BoardState, heuristic, beam_width=3, depth_limit=None, weight=1, screen=None, horizon=None, stats: dict = None, observer: SearchObserver = None, symmetry=False, visited=None):
+    # level by level: every node in the beam is expanded and only the best beam_width children make the next level.
+    # the boards of every level are remembered in the visited store (a FingerprintTable by default, 16 to 32
+    # bytes a board), so the beam never goes back to a board it already left and the search ends once every
+    # board it can reach was seen. each beam node keeps its parent chain alive, so the tree itself takes up to
+    # beam_width nodes per level of depth.
+    # with a horizon boards are only remembered for that many levels instead, which can loop forever without
+    # a depth_limit
+    observer, heuristic = prepare_observer(observer, screen, heuristic)
+    key = duplicate_key(symmetry)
+    beam = [TreeNode(board)]
+    recent = deque([set([key(board)])], maxlen=horizon)
+    if horizon is None or visited is not None:
+        visited = prepare_visited(visited, symmetry, FingerprintTable)
+        visited.add(board)
+    count = 0
+    peak_frontier = 1
+
+    while beam:
+        # max heap (by -f) holding the best children of this level as (-f, -insertion number, node),
+        # ties are broken in favour of the child generated first
+        best = []
+        kept = set()  # keys of the boards of the children in best
+        remembered = len(visited) if visited is not None else sum(len(level) for level in recent)
+
+        for node in beam:
+            if observer is not None:
+                if observer.node_popped(node, len(beam) + len(best), remembered):
+                    return None
+
+            if node.board.is_win():
+                if stats is not None:
+                    stats["peak_frontier"] = peak_frontier
+                if observer is not None:
+                    observer.solution_found(node)
+                return node
+
+            depth = node.depth() + 1
+            if depth_limit is not None and depth >= depth_limit:
+                continue
+
+            if stats is not None:
+                stats["expanded"] = stats.get("expanded", 0) + 1
+
+            for child in node.board.children_predicate(lambda b, p: b.should_move(p)):
+                child_key = key(child)
+                if child_key in kept or (child in visited if visited is not None
+                                         else any(child_key in level for level in recent)):
+                    if observer is not None:
+                        observer.duplicate_pruned(child)
+                    continue
+
+                entry = (-(depth + heuristic(child, depth) * weight),
+                         -count, TreeNode(child, parent=node))
+                count += 1
+                if observer is not None:
+                    observer.node_generated(entry[2])
+                if len(best) < beam_width:
+                    heapq.heappush(best, entry)
+                    kept.add(child_key)
+                elif entry > best[0]:
+                    evicted = heapq.heapreplace(best, entry)
+                    kept.discard(key(evicted[2].board))
+                    kept.add(child_key)
+
+            peak_frontier = max(peak_frontier, len(beam) + len(best))
+
+        beam = [entry[2] for entry in sorted(best, reverse=True)]
+        if visited is not None:
+            for node in beam:
+                visited.add(node.board)
+        else:
+            recent.append(kept)
+
+    if stats is not None:
+        stats["peak_frontier"] = peak_frontier
     return None
 
 
-def draw_search_debug(node: TreeNode, screen: pygame.Surface, visited=None, heuristic=None) -> bool:
-    for event in pygame.event.get():
-        cancel = False
-        if event.type == pygame.QUIT:
-            cancel = True
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                cancel = True
-
-        if cancel:
-            graphics.draw_text("Cancelled", screen,
-                               (screen.get_width() // 2 - 50, 20))
-            return True
-
-    graphics.draw_board(node.board, screen)
-    graphics.draw_text("Depth: " + str(node.depth()),
-                       screen, (screen.get_width() - 200, 0))
-
-    if heuristic is not None:
-        graphics.draw_text("Heuristic: " + str(heuristic(node.board, node.depth())),
-                           screen, (screen.get_width() - 200, 20))
-
-    if visited is not None:
-        graphics.draw_text("Visited: " + str(len(visited)),
-                           screen, (screen.get_width() - 200, 40))
-    pygame.display.flip()
-
-    return False
+# tests
+
+
+def test_ida_star_is_optimal():
+    import boards
+    import heuristics
+
+    heuristic = multi_heuristic([(heuristics.mst_gap_heuristic, lambda _: 1)])
+    for board in [boards.easy_1, boards.hard_1, boards.hard_3]:
+        node = ida_star(board, heuristic)
+        assert node.depth() == a_star(board, heuristic, reopen=True).depth()
+
+        path = get_path(node)
+        assert path[0].board == board and path[-1].board.is_win()
+
+    # without a transposition table only the current path is remembered
+    assert ida_star(boards.easy_1, heuristic, table_size=0).depth() == 5
+
+
+def test_beam_search_memory_is_bounded():
+    import boards
+
+    heuristic = multi_heuristic([(pieces_heuristic, lambda _: 100),
+                                 (manhattan_distance_heuristic(), lambda _: 1)])
+    stats = {}
+    node = beam_search(boards.hard_2, heuristic, beam_width=100, stats=stats)
+    assert node is not None and node.board.is_win()
+    assert stats["peak_frontier"] <= 2 * 100
+
+
+def test_solves_without_pygame():
+    import os
+    import subprocess
+
+    # a None entry in sys.modules makes `import pygame` fail like it would if it wasn't installed
+    code = "\n".join([
+        "import sys",
+        "sys.modules['pygame'] = None",
+        "import search, boards",
+        "heuristic = search.multi_heuristic([(search.pieces_heuristic, lambda _: 1)])",
+        "assert search.a_star(boards.hard_3, heuristic).board.is_win()",
+    ])
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def test_observer_events():
+    import boards
+
+    heuristic = multi_heuristic([(pieces_heuristic, lambda _: 100),
+                                 (manhattan_distance_heuristic(), lambda _: 1)])
+
+    class Recorder(SearchObserver):
+        def __init__(self):
+            self.solutions = []
+
+        def solution_found(self, node: TreeNode):
+            self.solutions.append(node)
+
+    recorder, counters = Recorder(), SearchCounters()
+    stats = {}
+    node = a_star(boards.hard_2, heuristic, stats=stats,
+                  observer=ObserverList([recorder, counters]))
+
+    assert recorder.solutions == [node]
+    # every popped node but the solution is expanded
+    assert counters.popped == stats["expanded"] + 1
+    assert counters.generated > 0 and counters.pruned > 0
+    assert counters.heuristic_calls == counters.generated + 1
+    assert 0 < counters.heuristic_share() < 1
+    assert counters.branching_factor() > 1 and counters.summary()["popped"] == counters.popped
+
+
+def test_observer_cancels():
+    import boards
+
+    class Cancel(SearchObserver):
+        def __init__(self):
+            self.popped = 0
+
+        def node_popped(self, node: TreeNode, open_size: int, closed_size: int) -> bool:
+            self.popped += 1
+            return self.popped == 3
+
+    heuristic = multi_heuristic([(pieces_heuristic, lambda _: 1)])
+    for search in [greedy_search, a_star, ida_star, beam_search]:
+        observer = Cancel()
+        assert search(boards.hard_1, heuristic, observer=observer) is None
+        assert observer.popped == 3
+
+
+def test_symmetric_duplicates():
+    import boards
+    import heuristics
+
+    # mirror images take as many moves, so pruning them keeps a* optimal and it expands fewer nodes
+    admissible = multi_heuristic([(heuristics.mst_gap_heuristic, lambda _: 1)])
+    plain, symmetric = {}, {}
+    assert a_star(boards.hard_2, admissible, reopen=True, stats=plain).depth() == 10
+    assert a_star(boards.hard_2, admissible, reopen=True, stats=symmetric, symmetry=True).depth() == 10
+    assert symmetric["expanded"] < plain["expanded"]
+
+    heuristic = multi_heuristic([(pieces_heuristic, lambda _: 1)])
+    assert greedy_search(boards.hard_3, heuristic, symmetry=True).board.is_win()
+    assert beam_search(boards.hard_3, heuristic, beam_width=50, symmetry=True).board.is_win()
+
+
+def test_same_search_in_every_process():
+    import os
+    import subprocess
+
+    # string hashes are randomized per process, the expanded nodes and the solution must not depend on them
+    code = "\n".join([
+        "import search, boards",
+        "import heuristics",
+        "heuristic = search.multi_heuristic([(search.pieces_heuristic, lambda _: 1),",
+        "                                    (heuristics.manhattan_distance_heuristic(), lambda _: 1)])",
+        "stats = {}",
+        "node = search.a_star(boards.medium_big, heuristic, stats=stats)",
+        "print(stats['expanded'], [n.board.key for n in search.get_path(node)])",
+    ])
+    outputs = set()
+    for seed in ["1", "2", "3"]:
+        outputs.add(subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   env=dict(os.environ, PYTHONHASHSEED=seed), check=True, capture_output=True).stdout)
+    assert len(outputs) == 1
+
+
+def test_arena_finds_the_same_solution():
+    import boards
+
+    heuristic = multi_heuristic([(pieces_heuristic, lambda _: 1)], cache_size=0)
+    expected, stats = {}, {}
+    node = a_star(boards.hard_3, heuristic, stats=expected)
+    # a cache this small has every board that is popped rebuilt from the moves
+    arena_node = a_star_arena(boards.hard_3, heuristic, cache_size=4, stats=stats)
+
+    assert [n.board for n in get_path(arena_node)] == [n.board for n in get_path(node)]
+    assert stats["expanded"] == expected["expanded"]
+    assert stats["arena_memory"] == stats["arena_nodes"] * 20
+
+    values = [-float("inf"), -3.5, -0.2, 0.0, 1e-300, 2, 2.5, 1e300, float("inf")]
+    assert sorted(values, key=float_order) == values
+
+
+def test_visited_stores():
+    import boards
+    import duplicates
+
+    heuristic = multi_heuristic([(pieces_heuristic, lambda _: 1)])
+    expected = a_star(boards.hard_3, heuristic)
+    for store in [duplicates.PackedSet(), duplicates.FingerprintTable()]:
+        node = a_star(boards.hard_3, heuristic, visited=store)
+        assert [n.board for n in get_path(node)] == [n.board for n in get_path(expected)]
+        assert len(store) > 0
+
+    assert dfs(boards.easy_1, visited=duplicates.BloomFilter(bits=1 << 16)).board.is_win()
+    assert beam_search(boards.hard_3, heuristic, beam_width=50,
+                       visited=duplicates.BloomFilter(bits=1 << 16)).board.is_win()
+
+    # arguments a search can't honor are refused rather than ignored
+    for call in [lambda: a_star(boards.hard_3, heuristic, reopen=True, visited=duplicates.PackedSet()),
+                 lambda: a_star(boards.hard_3, heuristic, visited=duplicates.PackedSet(symmetry=True)),
+                 lambda: a_star_arena(boards.hard_3, heuristic, symmetry=True, visited=duplicates.FingerprintTable()),
+                 lambda: beam_search(boards.hard_3, heuristic, visited=duplicates.BloomFilter(symmetry=True))]:
+        try:
+            call()
+        except ValueError:
+            pass
+        else:
+            assert False
+    assert a_star(boards.hard_3, heuristic, symmetry=True, visited=duplicates.PackedSet(symmetry=True)).board.is_win()
+
+
+def test_beam_search_terminates():
+    import random
+
+    # a beam that only remembered its last levels kept wandering over this board for thousands of levels
+    board = BoardState.generate_random(7, 7, 2, random.Random(2))
+    heuristic = multi_heuristic([(pieces_heuristic, lambda _: 100), (manhattan_distance_heuristic(), lambda _: 1)])
+    stats = {}
+    node = beam_search(board, heuristic, beam_width=50, stats=stats)
+    assert node is None or node.board.is_win()
+    assert stats["expanded"] < 50 * board.width * board.height * 4
+
+
+
+def test_open_list():
+    chain = [TreeNode(None)]
+    for _ in range(3):
+        chain.append(TreeNode(None, chain[-1]))
+
+    # all four nodes have the same f, only the tie breaker orders them
+    orders = {}
+    for tie_breaker in [fifo_tie_breaker, lifo_tie_breaker, deeper_first_tie_breaker]:
+        open_list = OpenList(tie_breaker)
+        for node in [chain[1], chain[3], chain[0], chain[2]]:
+            open_list.push(node, 5)
+        assert open_list.peek(2) == [open_list.pop(), open_list.pop()]
+        orders[tie_breaker] = [node.depth() for node in open_list.peek(2)]
+        assert len(open_list) == 2
+    assert orders == {fifo_tie_breaker: [0, 2], lifo_tie_breaker: [3, 1], deeper_first_tie_breaker: [1, 0]}
+
+    # the peak stays after the list shrinks
+    open_list = OpenList()
+    for f, node in enumerate(chain):
+        open_list.push(node, f)
+    open_list.pop()
+    open_list.pop()
+    open_list.push(chain[0], 0)
+    assert open_list.peak_size == 4 and len(open_list) == 3
+    assert open_list.peak_memory() == sys.getsizeof([]) + 4 * (sys.getsizeof((0, 0, 0, None)) + 8)
+
+
+def test_tie_breakers_and_side_by_side_searches():
+    import threading
+    import boards
+
+    def run(tie_breaker):
+        stats = {}
+        heuristic = multi_heuristic([(pieces_heuristic, lambda _: 1)])
+        node = a_star(boards.hard_3, heuristic, open_list=OpenList(tie_breaker), stats=stats)
+        return node.depth(), stats["expanded"]
+
+    tie_breakers = [fifo_tie_breaker, lifo_tie_breaker, deeper_first_tie_breaker]
+    sequential = {tie_breaker: run(tie_breaker) for tie_breaker in tie_breakers}
+
+    # the pieces heuristic has lots of ties, breaking them towards the newest or deepest nodes expands fewer
+    assert sequential[lifo_tie_breaker][1] < sequential[fifo_tie_breaker][1]
+    assert sequential[deeper_first_tie_breaker][1] < sequential[fifo_tie_breaker][1]
+    assert len(set(depth for depth, _ in sequential.values())) == 1
+
+    # every search keeps its state in its own open list and visited set, so searches interleaved in threads
+    # expand exactly what they expand one after the other
+    side_by_side = {}
+    threads = [threading.Thread(target=lambda tie_breaker=tie_breaker: side_by_side.update({tie_breaker: run(tie_breaker)}))
+               for tie_breaker in tie_breakers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert side_by_side == sequential
+
+
+def test_heuristic_cache():
+    import boards
+
+    calls = []
+
+    def counted(board):
+        calls.append(board)
+        return pieces_heuristic(board)
+
+    heuristic = multi_heuristic([(counted, lambda _: 1), (manhattan_distance_heuristic(), lambda depth: depth)])
+    first = a_star(boards.hard_3, heuristic)
+    after_first = heuristic.cache_info()
+    assert after_first.misses == len(calls) == len(set(calls)) and after_first.currsize == after_first.misses
+
+    # the same search again only hits the cache, the depth dependent weights are still applied on every call
+    second = a_star(boards.hard_3, heuristic)
+    after_second = heuristic.cache_info()
+    assert after_second.misses == after_first.misses and after_second.hits > after_first.hits
+    assert len(calls) == after_first.misses
+    assert [node.board for node in get_path(second)] == [node.board for node in get_path(first)]
+    assert heuristic(boards.hard_3, 2) == pieces_heuristic(boards.hard_3) + 2 * manhattan_distance_heuristic()(boards.hard_3)
+
+    heuristic.cache_clear()
+    assert heuristic.cache_info().currsize == 0
@@ -0,0 +1,167 @@
+import json
+import sqlite3
+import time
+from typing import Optional
+from puzzle import BoardState, layers_to_bytes
+import search
+
+# persistent solution cache in an sqlite file. a solution is stored once as its move list and every board on its
+# path points at the step it is at, so a board that shows up halfway through a stored solution is solved by the
+# rest of it. boards are keyed by their bytes with the colors relabeled by first appearance: the moves name
+# cells, not colors, so a recolored board takes the same ones (mirror images would need the moves mirrored)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS solutions (
+    id INTEGER PRIMARY KEY,
+    moves TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    optimal INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used);
+CREATE TABLE IF NOT EXISTS boards (
+    key BLOB PRIMARY KEY,
+    solution INTEGER NOT NULL,
+    step INTEGER NOT NULL,
+    remaining INTEGER NOT NULL,
+    optimal INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS boards_solution ON boards (solution);
+"""
+
+
+def cache_key(board: BoardState) -> bytes:
+    layers = sorted([layer for layer in board.key if layer], key=lambda layer: layer & -layer)
+    return layers_to_bytes(board.width, board.height, layers)
+
+
+class SolutionCache:
+    # at most max_boards boards are kept, the least recently used solutions (and their boards) go first
+    def __init__(self, path, max_boards=1 << 20):
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.executescript(SCHEMA)
+        self.max_boards = max_boards
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.connection.close()
+
+    def lookup(self, board: BoardState, optimal=False) -> Optional[dict]:
+        # {moves, depth, algorithm, optimal} of the cached solution for the board, with optimal only a proven one
+        row = self.connection.execute(
+            "SELECT solutions.id, moves, step, algorithm, boards.optimal FROM boards "
+            "JOIN solutions ON solutions.id = boards.solution WHERE key = ?", (cache_key(board),)).fetchone()
+        if row is None or (optimal and not row[4]):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        solution, moves, step, algorithm, proven = row
+        with self.connection:
+            self.connection.execute("UPDATE solutions SET used = ? WHERE id = ?", (time.time(), solution))
+        moves = json.loads(moves)[step:]
+        return {"moves": moves, "depth": len(moves), "algorithm": algorithm, "optimal": bool(proven)}
+
+    def store(self, path: list[search.TreeNode], algorithm: str, optimal=False):
+        # a solution path from get_path, a board already cached keeps its entry unless this one is shorter
+        # (or as long and proven optimal, every part of an optimal path is optimal too)
+        moves = search.path_moves(path)
+        with self.connection:
+            solution = self.connection.execute(
+                "INSERT INTO solutions (moves, algorithm, optimal, used) VALUES (?, ?, ?, ?)",
+                (json.dumps(moves), algorithm, int(optimal), time.time())).lastrowid
+            self.connection.executemany(
+                "INSERT INTO boards (key, solution, step, remaining, optimal) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET solution = excluded.solution, step = excluded.step, "
+                "remaining = excluded.remaining, optimal = excluded.optimal "
+                "WHERE excluded.remaining < remaining OR (excluded.remaining = remaining AND excluded.optimal > optimal)",
+                [(cache_key(node.board), solution, step, len(moves) - step, int(optimal))
+                 for step, node in enumerate(path)])
+            self.evict()
+
+    def evict(self):
+        count = self.connection.execute("SELECT COUNT(*) FROM boards").fetchone()[0]
+        while count > self.max_boards:
+            solution, = self.connection.execute("SELECT id FROM solutions ORDER BY used LIMIT 1").fetchone()
+            count -= self.connection.execute("DELETE FROM boards WHERE solution = ?", (solution,)).rowcount
+            self.connection.execute("DELETE FROM solutions WHERE id = ?", (solution,))
+
+    def solve(self, board: BoardState, solve, algorithm: str, optimal=False) -> Optional[search.TreeNode]:
+        # the cached solution replayed from the board, or solve(board) which is then cached.
+        # optimal says whether solve finds shortest solutions, and asks for a proven optimal cached one
+        cached = self.lookup(board, optimal)
+        if cached is not None:
+            return search.replay_moves(board, cached["moves"])
+
+        node = solve(board)
+        if node is not None:
+            self.store(search.get_path(node), algorithm, optimal)
+        return node
+
+    def stats(self) -> dict:
+        boards, = self.connection.execute("SELECT COUNT(*) FROM boards").fetchone()
+        solutions, = self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "boards": boards,
+            "solutions": solutions,
+        }
+
+# tests
+
+
+def test_cached_solutions(tmp_path):
+    import boards
+
+    heuristic = search.multi_heuristic([(search.pieces_heuristic, lambda _: 1)])
+    calls = []
+
+    def solve(board):
+        calls.append(board)
+        return search.a_star(board, heuristic)
+
+    cache = SolutionCache(tmp_path / "solutions.sqlite")
+    node = cache.solve(boards.hard_3, solve, "a*")
+    assert cache.solve(boards.hard_3, solve, "a*").board.is_win() and len(calls) == 1
+
+    # a board halfway through the solution takes the rest of it
+    path = search.get_path(node)
+    middle = path[len(path) // 2].board
+    cached = cache.lookup(middle)
+    assert cached["depth"] == node.depth() - len(path) // 2 and cached["algorithm"] == "a*"
+    assert search.replay_moves(middle, cached["moves"]).board.is_win()
+
+    # so does a recoloring of it
+    recolored = BoardState.from_string(boards.hard_3.to_string().translate(str.maketrans("RGBY", "YBGR")))
+    assert cache.solve(recolored, solve, "a*").board.is_win() and len(calls) == 1
+
+    # the solution isn't proven optimal
+    assert cache.lookup(boards.hard_3, optimal=True) is None
+    assert cache.stats() == {"hits": 3, "misses": 2, "hit_rate": 3 / 5,
+                             "boards": node.depth() + 1, "solutions": 1}
+    cache.close()
+
+    # it is kept on disk
+    cache = SolutionCache(tmp_path / "solutions.sqlite")
+    assert cache.lookup(boards.hard_3)["depth"] == node.depth()
+
+
+def test_eviction(tmp_path):
+    import boards
+
+    heuristic = search.multi_heuristic([(search.pieces_heuristic, lambda _: 1)])
+    cache = SolutionCache(tmp_path / "solutions.sqlite", max_boards=22)
+    first = cache.solve(boards.hard_3, lambda board: search.a_star(board, heuristic), "a*")
+    cache.solve(boards.easy_1, lambda board: search.a_star(board, heuristic), "a*")
+    assert cache.stats()["boards"] == first.depth() + 1 + 6
+
+    # the least recently used solution makes room for the new one
+    cache.lookup(boards.easy_1)
+    cache.solve(boards.hard_1, lambda board: search.a_star(board, heuristic), "a*")
+    assert cache.lookup(boards.hard_3) is None
+    assert cache.lookup(boards.easy_1) is not None and cache.lookup(boards.hard_1) is not None
+    assert cache.stats()["boards"] <= 22
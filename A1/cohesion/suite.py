@@ -0,0 +1,233 @@
+import argparse
+import csv
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Optional
+from puzzle import BoardState
+import boards
+import heuristics
+import search
+
+# benchmark suite: every registered algorithm runs on the named boards and on seeded random boards,
+# results can be saved as csv/json and compared against a stored baseline, run with
+# `python3 cohesion/suite.py --json results.json --baseline ../benchmark_baseline.json`
+
+# the heuristics are built for every run so no cache is shared between trials
+
+
+def pieces_distance():
+    return search.multi_heuristic([(search.pieces_heuristic, lambda _: 1),
+                                   (heuristics.manhattan_distance_heuristic(), lambda _: 1)])
+
+
+def mst_gaps():
+    return search.multi_heuristic([(heuristics.mst_gap_heuristic, lambda _: 1)])
+
+
+# name -> function from a board and a stats dict to a solution node
+ALGORITHMS = {
+    "Greedy (Pieces)": lambda board, stats: search.greedy_search(
+        board, search.multi_heuristic([(search.pieces_heuristic, lambda _: 1)]), stats=stats),
+    "A* (Pieces + Distance)": lambda board, stats: search.a_star(board, pieces_distance(), stats=stats),
+    "Weighted A* x1.5 (Pieces + Distance)": lambda board, stats: search.a_star(board, pieces_distance(), weight=1.5, stats=stats),
+    "Weighted A* x1.8 (Attract + Repel)": lambda board, stats: search.a_star(board, heuristics.default_heuristic(), weight=1.8, stats=stats),
+    "Beam 200 (Attract + Repel)": lambda board, stats: search.beam_search(board, heuristics.default_heuristic(), beam_width=200, stats=stats),
+    "A* reopen (MST gaps)": lambda board, stats: search.a_star(board, mst_gaps(), reopen=True, stats=stats),
+    "IDA* (MST gaps)": lambda board, stats: search.ida_star(board, mst_gaps(), stats=stats),
+}
+
+FIELDS = ["board", "algorithm", "solved", "trials", "median_time", "nodes", "peak_memory", "depth"]
+
+
+def random_boards(count=5, width=6, height=6, seed=0) -> dict[str, BoardState]:
+    result = {}
+    for i in range(count):
+        result["random_{}x{}_{}".format(width, height, seed + i)] = \
+            BoardState.generate_random(width, height, rng=random.Random(seed + i))
+    return result
+
+
+def run_once(solve, board: BoardState, timeout: float, memory=False) -> tuple[Optional[search.TreeNode], dict, float, int]:
+    # (solution node or None, stats, seconds, peak traced bytes), the node is None on timeouts too
+    stats = {}
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        node = search.run_with_timeout(lambda: solve(board, stats), timeout)
+    except TimeoutError:
+        node = None
+    duration = time.perf_counter() - start
+
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return node, stats, duration, peak
+
+
+def run_benchmark(board_name: str, board: BoardState, algorithm: str, trials=3, timeout=10) -> dict:
+    solve = ALGORITHMS[algorithm]
+    row = {"board": board_name, "algorithm": algorithm, "solved": False, "trials": trials,
+           "median_time": None, "nodes": None, "peak_memory": None, "depth": None}
+
+    times = []
+    for _ in range(trials):
+        node, stats, duration, _ = run_once(solve, board, timeout)
+        if node is None:
+            # a timeout (or no solution) ends the trials, the others would not finish either
+            return row
+        times.append(duration)
+
+    row["solved"] = True
+    row["median_time"] = statistics.median(times)
+    row["nodes"] = stats.get("expanded")
+    row["depth"] = node.depth()
+
+    # tracemalloc slows the search down, so memory is measured on a separate run that is not timed,
+    # with a longer timeout for that reason
+    node, _, _, peak = run_once(solve, board, timeout * 4, memory=True)
+    if node is not None:
+        row["peak_memory"] = peak
+    return row
+
+
+def run_suite(board_set: dict[str, BoardState], algorithms: list[str] = None, trials=3, timeout=10, log=None) -> list[dict]:
+    if algorithms is None:
+        algorithms = list(ALGORITHMS)
+
+    rows = []
+    for board_name, board in board_set.items():
+        for algorithm in algorithms:
+            row = run_benchmark(board_name, board, algorithm, trials, timeout)
+            rows.append(row)
+            if log is not None:
+                log.write(format_row(row) + "\n")
+                log.flush()
+    return rows
+
+
+def format_row(row: dict) -> str:
+    if not row["solved"]:
+        return "{:<14} {:<38} DNF".format(row["board"], row["algorithm"])
+    return "{:<14} {:<38} {:>9.4f}s {:>8} nodes {:>10} bytes  depth {}".format(
+        row["board"], row["algorithm"], row["median_time"], row["nodes"],
+        row["peak_memory"] if row["peak_memory"] is not None else "-", row["depth"])
+
+
+def write_csv(rows: list[dict], path):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: "DNF" if not row["solved"] and field == "median_time" else row[field]
+                             for field in FIELDS})
+
+
+def write_json(rows: list[dict], path):
+    with open(path, "w") as file:
+        json.dump(rows, file, indent=1)
+        file.write("\n")
+
+
+def compare(rows: list[dict], baseline: list[dict], time_ratio=1.5, memory_ratio=1.5) -> list[str]:
+    # regressions against the baseline: boards that are no longer solved, longer solutions, more nodes
+    # (searches are deterministic) and times or memory over the given ratios (they depend on the machine)
+    previous = {(row["board"], row["algorithm"]): row for row in baseline}
+    regressions = []
+    for row in rows:
+        old = previous.get((row["board"], row["algorithm"]))
+        if old is None or not old["solved"]:
+            continue
+
+        name = "{} / {}".format(row["board"], row["algorithm"])
+        if not row["solved"]:
+            regressions.append("{}: no longer solved".format(name))
+            continue
+        if row["depth"] > old["depth"]:
+            regressions.append("{}: depth {} -> {}".format(name, old["depth"], row["depth"]))
+        if row["nodes"] > old["nodes"]:
+            regressions.append("{}: nodes {} -> {}".format(name, old["nodes"], row["nodes"]))
+        if row["median_time"] > old["median_time"] * time_ratio:
+            regressions.append("{}: time {:.4f}s -> {:.4f}s".format(
+                name, old["median_time"], row["median_time"]))
+        if row["peak_memory"] is not None and old["peak_memory"] is not None and \
+                row["peak_memory"] > old["peak_memory"] * memory_ratio:
+            regressions.append("{}: peak memory {} -> {}".format(
+                name, old["peak_memory"], row["peak_memory"]))
+    return regressions
+
+
+def main(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="benchmark the search algorithms")
+    parser.add_argument("--boards", nargs="*",
+                        help="board names, the named boards and the random ones by default")
+    parser.add_argument("--algorithms", nargs="*", choices=list(ALGORITHMS), metavar="ALGORITHM")
+    parser.add_argument("--random", type=int, default=5, help="number of random boards")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=10, help="seconds per run")
+    parser.add_argument("--csv")
+    parser.add_argument("--json")
+    parser.add_argument("--baseline", help="json results to compare against")
+    parser.add_argument("--time-ratio", type=float, default=1.5,
+                        help="slowdown over the baseline reported as a regression")
+    options = parser.parse_args(args)
+
+    board_set = dict(boards.NAMED)
+    board_set.update(random_boards(options.random, seed=options.seed))
+    if options.boards:
+        board_set = {name: board_set[name] for name in options.boards}
+
+    rows = run_suite(board_set, options.algorithms, options.trials, options.timeout, log=sys.stdout)
+
+    if options.csv:
+        write_csv(rows, options.csv)
+    if options.json:
+        write_json(rows, options.json)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare(rows, json.load(file), options.time_ratio)
+        for regression in regressions:
+            print("Regression:", regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
+
+# tests
+
+
+def test_suite_compares_with_baseline(tmp_path):
+    board_set = {"easy_1": boards.easy_1, "hard_3": boards.hard_3}
+    algorithms = ["Greedy (Pieces)", "A* reopen (MST gaps)"]
+    rows = run_suite(board_set, algorithms, trials=2)
+
+    assert [(row["board"], row["algorithm"]) for row in rows] == \
+        [(board, algorithm) for board in board_set for algorithm in algorithms]
+    assert all(row["solved"] and row["peak_memory"] > 0 for row in rows)
+    assert rows[1]["depth"] == 5  # optimal
+
+    write_json(rows, tmp_path / "rows.json")
+    write_csv(rows, tmp_path / "rows.csv")
+    baseline = json.loads((tmp_path / "rows.json").read_text())
+    assert compare(rows, baseline, time_ratio=100) == []
+
+    slower = dict(rows[1], nodes=rows[1]["nodes"] + 1, depth=6)
+    assert compare([slower], baseline, time_ratio=100) == [
+        "easy_1 / A* reopen (MST gaps): depth 5 -> 6",
+        "easy_1 / A* reopen (MST gaps): nodes {} -> {}".format(rows[1]["nodes"], rows[1]["nodes"] + 1),
+    ]
+
+
+def test_timeouts_are_dnf():
+    row = run_benchmark("hard_big_4", boards.hard_big_4, "IDA* (MST gaps)", timeout=0.2)
+    assert not row["solved"] and row["median_time"] is None